@@ -1,5 +1,18 @@
+import importlib
 import streamlit as st
-from screens import xml_checker, xml_comparer, xml_field_explorer
+from data import instrumentation
+from data.instrumentation import stage
+from ui.backend import parser_selector
+
+# Screen module of every page. Only the page being shown is imported, so a
+# cold start doesn't load pandas, the charting stack or the PDF writer for
+# pages nobody opened.
+PAGES = {
+    "JSON-XML Comparer": 'screens.xml_checker',
+    "Compare XML Files": 'screens.xml_comparer',
+    "Compare Many XML Files": 'screens.xml_multi_comparer',
+    "XML Field Explorer": 'screens.xml_field_explorer'
+}
 
 def main():
     st.set_page_config(page_title='JSON-XML Comparer', layout="wide")
@@ -8,20 +21,29 @@ def main():
 
     # Navbar for navigation
     with col1:
-        page = st.selectbox("Navigation", ["JSON-XML Comparer", "Compare XML Files", "XML Field Explorer"])
+        page = st.selectbox("Navigation", list(PAGES))
     with col2:
-        st.write("")
+        parser_selector()
     with col3:
-        st.write("")
+        diagnostics = st.checkbox("Show diagnostics", help="Record wall time, CPU time and peak memory of each processing stage. Memory tracing slows processing down while it is on.")
+
+    if diagnostics:
+        instrumentation.reset()
+        instrumentation.enable()
 
-    if page == "JSON-XML Comparer":
-        xml_checker.render_page()
+    try:
+        # Recorded as a stage, so the import cost of a page shows up the first time it is opened
+        with stage(f'import {PAGES[page]}'):
+            screen = importlib.import_module(PAGES[page])
+        screen.render_page()
 
-    elif page == "Compare XML Files":
-        xml_comparer.render_page()
-    
-    elif page == "XML Field Explorer":
-        xml_field_explorer.render_page()
+        if diagnostics:
+            from ui.display import display_diagnostics
+            display_diagnostics(instrumentation.records())
+    finally:
+        # Every rerun runs in a new thread; stop tracing memory for this one
+        # so tracemalloc doesn't stay on once no session shows diagnostics
+        instrumentation.disable()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,132 @@
+import random
+import argparse
+from xml.sax.saxutils import escape
+
+# Field names of real partner feeds, padded with Extra_Field_N when more are requested
+BASE_FIELDS = [
+    "Title", "Property_Reference", "Unit_Number", "Type", "Bedrooms", "Bathrooms", "Project",
+    "Price", "VAT", "Status", "Area", "Location", "Latitude", "Longitude",
+    "Apartment_Floor", "Block", "Phase", "Construction_Stage", "Plot_Size",
+    "Yard", "Total_Covered_Areas", "Internal_Covered_Areas", "Covered_Verandas",
+    "Semi_Covered_Verandas", "Uncovered_Verandas", "Covered_Parking",
+    "Semi_Covered_Parking", "Uncovered_Parking", "Storage_Size",
+    "Swimming_Pool", "Energy_Efficient_Content", "Description", "gallery"
+]
+
+# Low-cardinality fields, as in real feeds
+CHOICES = {
+    "Type": ["Apartment", "Villa", "Townhouse", "Penthouse", "Studio"],
+    "Status": ["Available", "Reserved", "Sold"],
+    "VAT": ["0", "5", "19"],
+    "Location": ["Limassol", "Paphos", "Larnaca", "Nicosia", "Famagusta"],
+    "Construction_Stage": ["Off-plan", "Under construction", "Completed"],
+    "Swimming_Pool": ["Private", "Communal", "None"],
+}
+
+# Keys are never missing or mismatched so every generated property can be matched
+KEY_FIELDS = ("Title", "Property_Reference")
+
+WORDS = ("sea view modern kitchen spacious balcony quiet area close to amenities "
+         "parking storage luxury finishes open plan garden").split()
+
+def field_names(field_count):
+    if field_count <= len(BASE_FIELDS):
+        return BASE_FIELDS[:field_count]
+    extra = [f"Extra_Field_{i}" for i in range(field_count - len(BASE_FIELDS))]
+    return BASE_FIELDS + extra
+
+def _text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+def _value(rng, field, index, text_size):
+    if field == "Title":
+        return f"Property {index}"
+    if field == "Property_Reference":
+        return f"REF-{index:08d}"
+    if field in CHOICES:
+        return rng.choice(CHOICES[field])
+    if field == "Description":
+        return _text(rng, text_size)
+    if field in ("Latitude", "Longitude"):
+        return f"{rng.uniform(34.5, 35.5):.6f}"
+    if field in ("Price", "Area", "Plot_Size", "Bedrooms", "Bathrooms"):
+        return str(rng.randint(1, 900000))
+    return f"{field} {rng.randint(0, 50)}"
+
+def _gallery(rng, index, text_size):
+    # Roughly text_size characters worth of image URLs
+    count = max(1, text_size // 40)
+    return "".join(f"<image>https://example.com/{index}/{i}.jpg</image>" for i in range(count))
+
+def generate_feeds(properties=1000, fields=33, missing_rate=0.05, mismatch_rate=0.02, text_size=500, seed=0):
+    """Generate a (reference, candidate) pair of synthetic property feeds as UTF-8 bytes.
+
+    Each field is left out of a property with probability missing_rate in
+    either feed, and the candidate's value differs from the reference with
+    probability mismatch_rate. Description and gallery are about text_size
+    characters long.
+    """
+    rng = random.Random(seed)
+    names = field_names(fields)
+    reference = ['<?xml version="1.0" encoding="UTF-8"?>\n<root><properties>']
+    candidate = list(reference)
+
+    for index in range(properties):
+        parts1 = ["<property>"]
+        parts2 = ["<property>"]
+        for field in names:
+            if field == "gallery":
+                value = _gallery(rng, index, text_size)
+                element = f"<gallery>{value}</gallery>"
+                if rng.random() >= missing_rate:
+                    parts1.append(element)
+                if rng.random() >= missing_rate:
+                    parts2.append(element)
+                continue
+
+            value = _value(rng, field, index, text_size)
+            other = value
+            if field not in KEY_FIELDS and rng.random() < mismatch_rate:
+                other = _value(rng, field, index + properties, text_size) + " changed"
+
+            if field in KEY_FIELDS or rng.random() >= missing_rate:
+                parts1.append(f"<{field}>{escape(value)}</{field}>")
+            if field in KEY_FIELDS or rng.random() >= missing_rate:
+                parts2.append(f"<{field}>{escape(other)}</{field}>")
+
+        parts1.append("</property>")
+        parts2.append("</property>")
+        reference.append("".join(parts1))
+        candidate.append("".join(parts2))
+
+    reference.append("</properties></root>\n")
+    candidate.append("</properties></root>\n")
+    return "".join(reference).encode("utf-8"), "".join(candidate).encode("utf-8")
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a pair of synthetic property feeds.")
+    parser.add_argument("reference", help="Output path of the reference feed")
+    parser.add_argument("candidate", help="Output path of the feed to compare")
+    parser.add_argument("--properties", type=int, default=1000)
+    parser.add_argument("--fields", type=int, default=33)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--mismatch-rate", type=float, default=0.02)
+    parser.add_argument("--text-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    reference, candidate = generate_feeds(args.properties, args.fields, args.missing_rate,
+                                          args.mismatch_rate, args.text_size, args.seed)
+    with open(args.reference, "wb") as file:
+        file.write(reference)
+    with open(args.candidate, "wb") as file:
+        file.write(candidate)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import importlib.util
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.feed_generator import generate_feeds
+from data.xml_backend import get_backend, set_backend, BACKEND_CHOICES
+from data.field_comparator import extract_all_fields, compare_field_structure, compare_fields
+from data.value_comparator import compare_field_values
+from data.normalization import get_normalizer
+from data.field_index import build_field_index
+from data.xml_stream import content_stream
+
+def _load_cli():
+    # xml-checker.py can't be imported by name because of the dash
+    spec = importlib.util.spec_from_file_location('xml_checker_cli', os.path.join(ROOT, 'xml-checker.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def measure(function, repeat):
+    """Best wall and CPU time over `repeat` runs, plus peak traced memory of one extra run.
+    tracemalloc only sees Python allocations, not lxml's own C buffers."""
+    wall_times = []
+    cpu_times = []
+    for _ in range(repeat):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        function()
+        cpu_times.append(time.process_time() - cpu_start)
+        wall_times.append(time.perf_counter() - wall_start)
+
+    # Memory is traced in a separate run so tracing overhead doesn't skew the timings
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_s': round(min(wall_times), 6),
+        'cpu_s': round(min(cpu_times), 6),
+        'peak_mb': round(peak / (1024 * 1024), 3)
+    }
+
+def run(args):
+    set_backend(args.parser)
+    reference, candidate = generate_feeds(args.properties, args.fields, args.missing_rate,
+                                          args.mismatch_rate, args.text_size, args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        reference_path = os.path.join(directory, 'reference.xml')
+        with open(reference_path, 'wb') as file:
+            file.write(reference)
+
+        cli = _load_cli()
+        fields1 = extract_all_fields(reference)
+        fields2 = extract_all_fields(candidate)
+        _, _, common_titles = compare_fields(fields1, fields2)
+        mismatches = compare_field_values(fields1, fields2, common_titles, 'reference.xml', 'candidate.xml')
+        required_fields = cli.load_required_fields(os.path.join(ROOT, 'required_fields.json'))
+
+        stages = {
+            'extract_all_fields': lambda: extract_all_fields(reference),
+            'compare_field_structure': lambda: compare_field_structure(reference, candidate),
+            'compare_field_values': lambda: compare_field_values(fields1, fields2, common_titles,
+                                                                 'reference.xml', 'candidate.xml'),
+            'compare_field_values_decimal': lambda: compare_field_values(
+                fields1, fields2, common_titles, 'reference.xml', 'candidate.xml',
+                get_normalizer('full', True, 'decimal')),
+            'check_missing_fields': lambda: cli.count_missing_fields(reference_path, required_fields),
+        }
+
+        if not args.skip_ui:
+            from files.pdf_report import write_pdf_report
+
+            def field_explorer():
+                field_index = build_field_index(content_stream(reference))
+                for stats in field_index.values():
+                    stats.values.most_common()
+
+            stages['field_explorer_analysis'] = field_explorer
+            pdf_path = os.path.join(directory, 'report.pdf')
+            stages['pdf_report'] = lambda: write_pdf_report(
+                mismatches, 'reference.xml', 'candidate.xml', pdf_path)
+
+        results = {}
+        for name, function in stages.items():
+            if args.stage and name not in args.stage:
+                continue
+            results[name] = measure(function, args.repeat)
+            print(f"{name:28s} {results[name]['wall_s']:10.4f}s wall "
+                  f"{results[name]['cpu_s']:10.4f}s cpu {results[name]['peak_mb']:10.2f} MB peak", file=sys.stderr)
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parser': get_backend().name,
+            'feed_bytes': len(reference),
+            'mismatch_rows': len(mismatches),
+            'parameters': {
+                'properties': args.properties,
+                'fields': args.fields,
+                'missing_rate': args.missing_rate,
+                'mismatch_rate': args.mismatch_rate,
+                'text_size': args.text_size,
+                'seed': args.seed,
+                'repeat': args.repeat
+            }
+        },
+        'stages': results
+    }
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_with_baseline(results, baseline_path):
+    """Print the wall time and peak memory ratio of every stage against an earlier run"""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    print(f"Compared with {baseline['meta'].get('revision')} ({baseline_path}):", file=sys.stderr)
+    for name, current in results['stages'].items():
+        previous = baseline['stages'].get(name)
+        if not previous:
+            continue
+        wall_ratio = current['wall_s'] / previous['wall_s'] if previous['wall_s'] else float('inf')
+        memory_ratio = current['peak_mb'] / previous['peak_mb'] if previous['peak_mb'] else float('inf')
+        print(f"  {name:28s} time x{wall_ratio:6.2f}   memory x{memory_ratio:6.2f}", file=sys.stderr)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time and memory-profile each pipeline stage on synthetic feeds.")
+    parser.add_argument('--properties', type=int, default=5000)
+    parser.add_argument('--fields', type=int, default=33)
+    parser.add_argument('--missing-rate', type=float, default=0.05)
+    parser.add_argument('--mismatch-rate', type=float, default=0.02)
+    parser.add_argument('--text-size', type=int, default=500, help="Length of Description and gallery content")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the best one is reported")
+    parser.add_argument('--parser', choices=BACKEND_CHOICES, default='auto')
+    parser.add_argument('--stage', action='append', help="Only run this stage (may be repeated)")
+    parser.add_argument('--skip-ui', action='store_true', help="Skip the field explorer and PDF report stages")
+    parser.add_argument('--output', help="Write the results JSON here instead of stdout")
+    parser.add_argument('--baseline', help="Results JSON of an earlier revision to compare against")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.feed_generator import generate_feeds
+from benchmarks.run_benchmarks import _git_revision
+
+# Modules whose import is measured on its own: the app shell and every page it can load
+MODULES = ['app', 'screens.xml_checker', 'screens.xml_comparer', 'screens.xml_multi_comparer',
+           'screens.xml_field_explorer', 'service.server']
+
+# Heavy libraries reported as loaded or not after each target
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'lxml.etree', 'reportlab', 'streamlit', 'altair']
+
+def parse_importtime(stderr):
+    """(total self time in seconds, {top-level module: cumulative seconds}) from -X importtime output"""
+    total = 0
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us)
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = int(cumulative_us) / 1e6
+    return total / 1e6, top_level
+
+def run_target(command, repeat, top):
+    """Best wall time of a fresh interpreter running command, plus the import
+    breakdown and the heavy libraries loaded, from one extra -X importtime run"""
+    wall_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wall_times.append(time.perf_counter() - start)
+
+    probe = ("import sys, runpy; sys.argv = {argv!r}; "
+             "code = {code!r}\n"
+             "try:\n    exec(code)\nexcept SystemExit:\n    pass\n"
+             "sys.stderr.write('loaded: ' + ','.join(m for m in {heavy!r} if m in sys.modules) + '\\n')")
+    if command[0] == '-c':
+        code = command[1]
+        argv = ['-c']
+    else:
+        code = f"runpy.run_path({command[0]!r}, run_name='__main__')"
+        argv = command
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                                probe.format(argv=argv, code=code, heavy=HEAVY_MODULES)],
+                               cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    import_s, top_level = parse_importtime(completed.stderr)
+    loaded = next((line[len('loaded: '):] for line in completed.stderr.splitlines() if line.startswith('loaded: ')), '')
+
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'wall_s': round(min(wall_times), 4),
+        'import_s': round(import_s, 4),
+        'slowest_imports': {name: round(seconds, 4) for name, seconds in slowest},
+        'heavy_modules_loaded': [name for name in loaded.split(',') if name]
+    }
+
+def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        # A small feed for the CLI runs, so their time is dominated by start-up
+        feed_dir = os.path.join(directory, 'xmls')
+        os.makedirs(feed_dir)
+        reference, _ = generate_feeds(args.properties, 10, 0.05, 0.02, 50, 0)
+        with open(os.path.join(feed_dir, 'feed.xml'), 'wb') as file:
+            file.write(reference)
+        required_fields = os.path.join(ROOT, 'required_fields.json')
+
+        targets = {f'import {module}': ['-c', f'import {module}'] for module in MODULES}
+        targets['cli --help'] = ['xml-checker.py', '--help']
+        targets['cli check'] = ['xml-checker.py', '--xml-dir', feed_dir, '--required-fields', required_fields, '--no-cache']
+
+        results = {}
+        for name, command in targets.items():
+            results[name] = run_target(command, args.repeat, args.top)
+            result = results[name]
+            print(f"{name:36s} {result['wall_s']:8.3f}s wall {result['import_s']:8.3f}s importing  "
+                  f"loads: {', '.join(result['heavy_modules_loaded']) or '-'}", file=sys.stderr)
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'targets': results
+    }
+
+def compare_with_baseline(results, baseline_path):
+    """Print the start-up time ratio of every target against an earlier run"""
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    print(f"Compared with {baseline['meta'].get('revision')} ({baseline_path}):", file=sys.stderr)
+    for name, current in results['targets'].items():
+        previous = baseline['targets'].get(name)
+        if not previous:
+            continue
+        ratio = current['wall_s'] / previous['wall_s'] if previous['wall_s'] else float('inf')
+        print(f"  {name:36s} {previous['wall_s']:8.3f}s -> {current['wall_s']:8.3f}s  x{ratio:5.2f}", file=sys.stderr)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure cold start: import time of the app and its pages, and CLI start-up.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreter runs per target; the best one is reported")
+    parser.add_argument('--top', type=int, default=5, help="Slowest top-level imports listed per target")
+    parser.add_argument('--properties', type=int, default=200, help="Properties in the feed checked by the CLI target")
+    parser.add_argument('--output', help="Write the results JSON here instead of stdout")
+    parser.add_argument('--baseline', help="Results JSON of an earlier revision to compare against")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from data.xml_stream import content_stream, iter_properties, mapped_file
+from data.property_matcher import DEFAULT_KEY, key_label, parse_key
+from data.value_comparator import MATCH_BATCH_SIZE, NOT_PRESENT, compare_cells
+from data.normalization import DEFAULT_NORMALIZER
+from files.cache import content_digest
+
+# Bump whenever the table layout or what is stored in it changes
+STORE_VERSION = 1
+
+# Properties inserted per executemany call while a feed is loaded
+LOAD_BATCH_SIZE = 5000
+
+# Page cache of the SQLite connection; everything beyond it stays on disk
+DEFAULT_CACHE_MB = 64
+
+# Joins the parts of a composite key in the stored key text. It sorts below
+# every printable character, so stored keys order like the key tuples.
+KEY_SEPARATOR = '\x1f'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    member TEXT,
+    key_fields TEXT NOT NULL,
+    property_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS feed_fields (
+    feed INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    properties INTEGER NOT NULL,
+    PRIMARY KEY (feed, field)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS properties (
+    feed INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    key TEXT,
+    PRIMARY KEY (feed, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS properties_key ON properties (feed, key);
+CREATE TABLE IF NOT EXISTS property_values (
+    feed INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (feed, row, field)
+) WITHOUT ROWID;
+"""
+
+class FeedStore:
+    """Feeds kept in a local SQLite database instead of in memory, for feeds
+    larger than RAM.
+
+    Each feed is streamed in one <property> at a time (see
+    data/xml_stream.iter_properties) and stored as one row per property,
+    indexed by its match key, and one row per field value. Field structure
+    checks, key matching and value diffs then run as indexed set and join
+    queries, and value mismatches come out in batches, so memory use follows
+    the batch size rather than the feed size.
+
+    A feed is stored once per content digest and match key: with a
+    persistent path, running again on the same file reuses it. Without a
+    path the database is a temporary file removed on close().
+    """
+
+    def __init__(self, path=None, cache_mb=DEFAULT_CACHE_MB):
+        self.path = path
+        # An empty name gives a private on-disk database that SQLite deletes on
+        # close; autocommit, as loads manage their own transaction
+        self.connection = sqlite3.connect(path or '', isolation_level=None)
+        self.connection.execute(f'PRAGMA cache_size = {-int(cache_mb * 1024)}')
+        # Sorts and temporary tables spill to disk too
+        self.connection.execute('PRAGMA temp_store = FILE')
+        # A store is a rebuildable cache of the feeds, not a database of record
+        self.connection.execute('PRAGMA synchronous = OFF')
+
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, STORE_VERSION):
+            raise ValueError(f"{self.path} was written by another version of the feed store; delete it or use another path")
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {STORE_VERSION}')
+        self._field_ids = dict(self.connection.execute('SELECT name, id FROM fields'))
+        self._pairs = None
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _field_id(self, name):
+        field_id = self._field_ids.get(name)
+        if field_id is None:
+            field_id = self.connection.execute('INSERT INTO fields (name) VALUES (?)', (name,)).lastrowid
+            self._field_ids[name] = field_id
+        return field_id
+
+    def load(self, path, name=None, key=DEFAULT_KEY, member=None):
+        """Store a feed file (optionally a member of a zip archive; compressed
+        feeds are decompressed while streaming) and return its feed id. A feed
+        already stored with the same content and key is not loaded again."""
+        key_fields = parse_key(key)
+        with mapped_file(path) as mapping:
+            digest = content_digest(mapping)
+            row = self.connection.execute(
+                'SELECT id FROM feeds WHERE digest = ? AND member IS ? AND key_fields = ?',
+                (digest, member, key_label(key_fields))
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            return self._load_stream(content_stream(mapping, member), name or os.path.basename(path),
+                                     digest, member, key_fields)
+
+    def _load_stream(self, stream, name, digest, member, key_fields):
+        connection = self.connection
+        connection.execute('BEGIN')
+        try:
+            feed = connection.execute(
+                'INSERT INTO feeds (name, digest, member, key_fields, property_count) VALUES (?, ?, ?, ?, 0)',
+                (name, digest, member, key_label(key_fields))
+            ).lastrowid
+
+            field_counts = {}
+            properties = []
+            values = []
+            row = -1
+            for row, property in enumerate(iter_properties(stream)):
+                # A tag repeated within a property keeps its last value, as in PropertyStore
+                items = {child.tag: child.text for child in property}
+                parts = [items.get(field) for field in key_fields]
+                properties.append((feed, row, KEY_SEPARATOR.join(parts) if all(parts) else None))
+                for tag, text in items.items():
+                    field = self._field_id(tag)
+                    field_counts[field] = field_counts.get(field, 0) + 1
+                    values.append((feed, row, field, text))
+
+                if len(properties) >= LOAD_BATCH_SIZE:
+                    self._insert(properties, values)
+                    properties, values = [], []
+            self._insert(properties, values)
+
+            connection.executemany('INSERT INTO feed_fields (feed, field, properties) VALUES (?, ?, ?)',
+                                   [(feed, field, count) for field, count in field_counts.items()])
+            connection.execute('UPDATE feeds SET property_count = ? WHERE id = ?', (row + 1, feed))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            # Field ids inserted by the rolled back load are gone too
+            self._field_ids = dict(connection.execute('SELECT name, id FROM fields'))
+            raise
+        return feed
+
+    def _insert(self, properties, values):
+        self.connection.executemany('INSERT INTO properties (feed, row, key) VALUES (?, ?, ?)', properties)
+        self.connection.executemany('INSERT INTO property_values (feed, row, field, value) VALUES (?, ?, ?, ?)', values)
+
+    def feed_info(self, feed):
+        name, key_fields, property_count = self.connection.execute(
+            'SELECT name, key_fields, property_count FROM feeds WHERE id = ?', (feed,)
+        ).fetchone()
+        return {'name': name, 'key_fields': parse_key(key_fields), 'property_count': property_count}
+
+    def field_structure(self, feed):
+        """Sorted list of every field name seen on the feed's properties"""
+        return [name for name, in self.connection.execute(
+            'SELECT name FROM fields JOIN feed_fields ON field = id WHERE feed = ? ORDER BY name', (feed,))]
+
+    def field_counts(self, feed):
+        """Number of properties carrying each field"""
+        return dict(self.connection.execute(
+            'SELECT name, properties FROM fields JOIN feed_fields ON field = id WHERE feed = ? ORDER BY name', (feed,)))
+
+    def compare_structure(self, reference, feed):
+        """compare_field_structure (data/field_comparator.py) of two stored feeds"""
+        reference_fields = self.field_structure(reference)
+        missing_fields = [name for name, in self.connection.execute(
+            'SELECT name FROM fields WHERE id IN '
+            '(SELECT field FROM feed_fields WHERE feed = ? EXCEPT SELECT field FROM feed_fields WHERE feed = ?) '
+            'ORDER BY name', (reference, feed))]
+        return {
+            'reference_fields': reference_fields,
+            'missing_in_second_file': missing_fields,
+            'total_reference_fields': len(reference_fields),
+            'total_missing': len(missing_fields)
+        }
+
+    def _check_keys(self, feed1, feed2):
+        key_fields1 = self.feed_info(feed1)['key_fields']
+        key_fields2 = self.feed_info(feed2)['key_fields']
+        if key_fields1 != key_fields2:
+            raise ValueError(f"The feeds were stored with different match keys: "
+                             f"{key_label(key_fields1)} and {key_label(key_fields2)}")
+        return key_fields1
+
+    def _build_pairs(self, feed1, feed2):
+        """(Re)build the temp.pairs table: one row per key found exactly once
+        in both feeds, numbered in key order so batches are id ranges"""
+        if self._pairs == (feed1, feed2):
+            return
+        self._check_keys(feed1, feed2)
+        connection = self.connection
+        connection.execute('DROP TABLE IF EXISTS temp.pairs')
+        connection.execute('CREATE TEMP TABLE pairs (id INTEGER PRIMARY KEY, key TEXT, row1 INTEGER, row2 INTEGER)')
+        connection.execute("""
+            INSERT INTO temp.pairs (key, row1, row2)
+            SELECT one.key, one.row, two.row
+            FROM (SELECT key, MIN(row) AS row FROM properties WHERE feed = ? AND key IS NOT NULL
+                  GROUP BY key HAVING COUNT(*) = 1) AS one
+            JOIN (SELECT key, MIN(row) AS row FROM properties WHERE feed = ? AND key IS NOT NULL
+                  GROUP BY key HAVING COUNT(*) = 1) AS two ON two.key = one.key
+            ORDER BY one.key
+        """, (feed1, feed2))
+        self._pairs = (feed1, feed2)
+
+    def match(self, feed1, feed2):
+        """match_summary (data/property_matcher.py) of two stored feeds, with
+        counts instead of key lists: there may be millions of keys. The keys
+        themselves come from iter_keys_only_in and duplicate_keys."""
+        key_fields = self._check_keys(feed1, feed2)
+        self._build_pairs(feed1, feed2)
+
+        def count(sql, *parameters):
+            return self.connection.execute(sql, parameters).fetchone()[0]
+
+        only_in = ('SELECT COUNT(DISTINCT key) FROM properties AS p WHERE feed = ? AND key IS NOT NULL AND NOT EXISTS '
+                   '(SELECT 1 FROM properties AS q WHERE q.feed = ? AND q.key = p.key)')
+        duplicates = ('SELECT COUNT(*) FROM (SELECT key FROM properties WHERE feed = ? AND key IS NOT NULL '
+                      'GROUP BY key HAVING COUNT(*) > 1)')
+        unkeyed = 'SELECT COUNT(*) FROM properties WHERE feed = ? AND key IS NULL'
+        return {
+            'key_fields': key_fields,
+            'method': 'sqlite',
+            'matched': count('SELECT COUNT(*) FROM temp.pairs'),
+            'only_in_first': count(only_in, feed1, feed2),
+            'only_in_second': count(only_in, feed2, feed1),
+            'duplicates_in_first': count(duplicates, feed1),
+            'duplicates_in_second': count(duplicates, feed2),
+            'unkeyed_first': count(unkeyed, feed1),
+            'unkeyed_second': count(unkeyed, feed2)
+        }
+
+    def iter_keys_only_in(self, feed, other, batch_size=MATCH_BATCH_SIZE):
+        """Display keys of feed's properties with no match in other, sorted, in lists of batch_size"""
+        cursor = self.connection.execute(
+            'SELECT DISTINCT key FROM properties AS p WHERE feed = ? AND key IS NOT NULL AND NOT EXISTS '
+            '(SELECT 1 FROM properties AS q WHERE q.feed = ? AND q.key = p.key) ORDER BY key', (feed, other))
+        while batch := cursor.fetchmany(batch_size):
+            yield [_display_key(key) for key, in batch]
+
+    def duplicate_keys(self, feed):
+        """{display key: count} of the keys found more than once in a feed"""
+        return {_display_key(key): count for key, count in self.connection.execute(
+            'SELECT key, COUNT(*) FROM properties WHERE feed = ? AND key IS NOT NULL '
+            'GROUP BY key HAVING COUNT(*) > 1 ORDER BY key', (feed,))}
+
+    def iter_value_mismatches(self, feed1, feed2, file1_name, file2_name, batch_size=MATCH_BATCH_SIZE,
+                              normalizer=DEFAULT_NORMALIZER):
+        """
+        compare_matched_values (data/value_comparator.py) of two stored feeds,
+        as one DataFrame per batch of batch_size matched pairs (at least one,
+        possibly empty), in key order. The frames have the same columns.
+
+        Cells whose raw text is identical can't mismatch, so the join only
+        returns cells that differ as stored (or exist on one side only); the
+        normalizer then decides which of those really differ.
+        """
+        self._build_pairs(feed1, feed2)
+        key_fields = self.feed_info(feed1)['key_fields']
+        pair_count = self.connection.execute('SELECT COUNT(*) FROM temp.pairs').fetchone()[0]
+        title = self._field_ids.get('Title', -1)
+        reference = self._field_ids.get('Property_Reference', -1)
+        field_names = {field: name for name, field in self._field_ids.items()}
+
+        for start in range(1, pair_count + 1, batch_size) or [1]:
+            end = start + batch_size - 1
+            pairs = self.connection.execute("""
+                SELECT p.id, p.key, COALESCE(t1.value, t2.value, ''),
+                       CASE WHEN r1.field IS NULL THEN :missing ELSE r1.value END,
+                       CASE WHEN r2.field IS NULL THEN :missing ELSE r2.value END
+                FROM temp.pairs AS p
+                LEFT JOIN property_values AS t1 ON t1.feed = :feed1 AND t1.row = p.row1 AND t1.field = :title
+                LEFT JOIN property_values AS t2 ON t2.feed = :feed2 AND t2.row = p.row2 AND t2.field = :title
+                LEFT JOIN property_values AS r1 ON r1.feed = :feed1 AND r1.row = p.row1 AND r1.field = :reference
+                LEFT JOIN property_values AS r2 ON r2.feed = :feed2 AND r2.row = p.row2 AND r2.field = :reference
+                WHERE p.id BETWEEN :start AND :end
+            """, {'feed1': feed1, 'feed2': feed2, 'title': title, 'reference': reference,
+                  'missing': NOT_PRESENT, 'start': start, 'end': end}).fetchall()
+            # CROSS JOIN keeps SQLite on the pair range first instead of
+            # scanning a whole feed's values for the pairs of one batch
+            cells = self.connection.execute("""
+                SELECT p.id, a.field, 1, a.value, b.field IS NOT NULL, b.value
+                FROM temp.pairs AS p
+                CROSS JOIN property_values AS a ON a.feed = :feed1 AND a.row = p.row1
+                LEFT JOIN property_values AS b ON b.feed = :feed2 AND b.row = p.row2 AND b.field = a.field
+                WHERE p.id BETWEEN :start AND :end AND (b.field IS NULL OR a.value IS NOT b.value)
+                UNION ALL
+                SELECT p.id, b.field, 0, NULL, 1, b.value
+                FROM temp.pairs AS p
+                CROSS JOIN property_values AS b ON b.feed = :feed2 AND b.row = p.row2
+                WHERE p.id BETWEEN :start AND :end AND NOT EXISTS (
+                    SELECT 1 FROM property_values AS a WHERE a.feed = :feed1 AND a.row = p.row1 AND a.field = b.field)
+            """, {'feed1': feed1, 'feed2': feed2, 'start': start, 'end': end}).fetchall()
+            # Property-major, fields by name, like compare_matched_values
+            cells.sort(key=lambda cell: (cell[0], field_names[cell[1]]))
+            yield _mismatch_frame(pairs, cells, field_names, key_fields, file1_name, file2_name, normalizer)
+
+def _mismatch_frame(pairs, cells, field_names, key_fields, file1_name, file2_name, normalizer):
+    raw1 = np.empty(len(cells), dtype=object)
+    raw2 = np.empty(len(cells), dtype=object)
+    raw1[:] = [value1 if present1 else NOT_PRESENT for _, _, present1, value1, _, _ in cells]
+    raw2[:] = [value2 if present2 else NOT_PRESENT for _, _, _, _, present2, value2 in cells]
+    positions, both_numeric, values1, values2 = compare_cells(raw1, raw2, normalizer)
+
+    pair_info = {pair: info for pair, *info in pairs}
+    mismatched = [cells[position] for position in positions]
+    info = [pair_info[pair] for pair, *_ in mismatched]
+
+    references = np.empty(len(info), dtype=object)
+    references[:] = [reference1 if numeric else reference2
+                     for (_, _, reference1, reference2), numeric in zip(info, both_numeric)]
+    columns = {'Reference #': references}
+    if key_fields != ('Title',):
+        columns['Key'] = np.array([_display_key(key) for key, _, _, _ in info], dtype=object)
+    columns.update({
+        'Title': np.array([title for _, title, _, _ in info], dtype=object),
+        'Field': np.array([field_names[field] for _, field, *_ in mismatched], dtype=object),
+        f'{file1_name}': values1,
+        f'{file2_name}': values2
+    })
+    return pd.DataFrame(columns)
+
+def _display_key(key):
+    return key.replace(KEY_SEPARATOR, ' / ')
@@ -1,30 +1,33 @@
-import xml.etree.ElementTree as ET
+from data.parsed_feed import ParsedFeed, as_feed
+from data.xml_stream import content_stream, iter_properties
 
 def extract_all_fields(xml_content):
-    root = ET.fromstring(xml_content)
-    fields = {}
-    for property in root.findall('.//property'):
-        title = property.find('Title').text if property.find('Title') is not None else None
-        if title:
-            fields[title] = {child.tag: child.text for child in property}
-    return fields
+    return as_feed(xml_content).properties
 
 def extract_field_structure(xml_content):
     """Extract all unique field names (tags) from the XML structure"""
-    root = ET.fromstring(xml_content)
+    return sorted(_field_set(xml_content))
+
+def scan_field_structure(source):
+    """Collect the set of property field names from a file path or file object.
+    Streams the feed and keeps nothing but the tag names."""
     field_names = set()
-    
-    for property in root.findall('.//property'):
+    for property in iter_properties(source):
         for child in property:
             field_names.add(child.tag)
-    
-    return sorted(list(field_names))
+    return field_names
+
+def _field_set(xml_content_or_feed):
+    if isinstance(xml_content_or_feed, ParsedFeed):
+        return xml_content_or_feed.tags
+    return scan_field_structure(content_stream(xml_content_or_feed))
 
 def compare_field_structure(xml_content1, xml_content2):
     """Compare field structures between two XML files.
-    Uses xml_content1 as the reference (correct structure)."""
-    fields_reference = set(extract_field_structure(xml_content1))
-    fields_to_check = set(extract_field_structure(xml_content2))
+    Uses xml_content1 as the reference (correct structure).
+    Either argument may be raw XML content or a ParsedFeed."""
+    fields_reference = _field_set(xml_content1)
+    fields_to_check = _field_set(xml_content2)
     
     # Find what's missing in the second file compared to the reference
     missing_fields = sorted(list(fields_reference - fields_to_check))
@@ -39,8 +42,8 @@ def compare_field_structure(xml_content1, xml_content2):
 def compare_field_structure_reverse(xml_content1, xml_content2):
     """Reverse comparison - check what fields exist in xml_content2 but not in xml_content1.
     Uses xml_content2 as the reference and checks what's extra/missing in xml_content1."""
-    fields_reference = set(extract_field_structure(xml_content2))
-    fields_to_check = set(extract_field_structure(xml_content1))
+    fields_reference = _field_set(xml_content2)
+    fields_to_check = _field_set(xml_content1)
     
     # Find what's missing in the first file compared to the second
     missing_fields = sorted(list(fields_reference - fields_to_check))
@@ -60,4 +63,12 @@ def compare_fields(fields1, fields2):
     missing_in_file1 = titles2 - titles1
     
     common_titles = titles1 & titles2
+    return missing_in_file1, missing_in_file2, common_titles
+
+def compare_feeds(feed1, feed2):
+    """compare_fields for two ParsedFeeds, reusing their prebuilt title sets"""
+    missing_in_file2 = feed1.titles - feed2.titles
+    missing_in_file1 = feed2.titles - feed1.titles
+
+    common_titles = feed1.titles & feed2.titles
     return missing_in_file1, missing_in_file2, common_titles
\ No newline at end of file
@@ -0,0 +1,55 @@
+from collections import Counter
+from data.xml_backend import get_backend
+
+# Non-empty values kept per field, in document order, for the sample list
+SAMPLE_SIZE = 10
+
+class FieldStats:
+    """Occurrences of one tag: how often it appears, how often it is empty,
+    and a histogram of its stripped non-empty values"""
+    __slots__ = ('count', 'empty_count', 'values', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.empty_count = 0
+        self.values = Counter()
+        self.samples = []
+
+    @property
+    def non_empty_count(self):
+        return self.count - self.empty_count
+
+def build_field_index(source, backend=None):
+    """Map every tag in an XML document to its FieldStats in a single streaming pass.
+
+    source is a file path or file object. Counts cover elements below the root,
+    like `.//tag`; the root tag is listed with no occurrences. backend is the
+    parser backend to use, the process default when None.
+    """
+    index = {}
+    pending = None
+    for element in (backend or get_backend()).iter_elements(source):
+        # The root element is always the last one to finish, so every element
+        # is recorded one step late and the final one is left out
+        if pending is not None:
+            _record(index, *pending)
+        pending = (element.tag, element.text)
+
+    if pending is not None:
+        index.setdefault(pending[0], FieldStats())
+    return index
+
+def _record(index, tag, text):
+    stats = index.get(tag)
+    if stats is None:
+        stats = index[tag] = FieldStats()
+
+    stats.count += 1
+    value = text.strip() if text is not None else ''
+    if not value:
+        stats.empty_count += 1
+        return
+
+    stats.values[value] += 1
+    if len(stats.samples) < SAMPLE_SIZE:
+        stats.samples.append(value)
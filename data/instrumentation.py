@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import tracemalloc
+
+# Profiling state is per thread: every Streamlit session reruns its script in
+# its own thread, so one session turning diagnostics on doesn't affect another
+_local = threading.local()
+_default_enabled = os.environ.get('XML_CHECKER_PROFILE') == '1'
+
+# tracemalloc is process-wide: it runs while any thread traces memory, and is
+# only stopped again if this module was the one that started it
+_tracing_lock = threading.Lock()
+_tracing_threads = set()
+_started_tracing = False
+
+def _state():
+    state = _local.__dict__
+    if 'enabled' not in state:
+        state['enabled'] = _default_enabled
+        state['trace_memory'] = _default_enabled
+        state['records'] = []
+        state['stack'] = []
+    return state
+
+def _trace_memory(thread, tracing):
+    global _started_tracing
+    with _tracing_lock:
+        if tracing:
+            _tracing_threads.add(thread)
+        else:
+            _tracing_threads.discard(thread)
+        # A thread that ended without calling disable() no longer counts
+        _tracing_threads.difference_update([thread for thread in _tracing_threads if not thread.is_alive()])
+
+        if _tracing_threads and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        elif not _tracing_threads and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+def enable(trace_memory=True):
+    """Record pipeline stages in this thread; trace_memory adds peak memory (slower)"""
+    state = _state()
+    state['enabled'] = True
+    state['trace_memory'] = trace_memory
+    _trace_memory(threading.current_thread(), trace_memory)
+
+def disable():
+    """Stop recording in this thread. Memory tracing stops once no thread uses it."""
+    state = _state()
+    state['enabled'] = False
+    state['trace_memory'] = False
+    _trace_memory(threading.current_thread(), False)
+
+def is_enabled():
+    return _state()['enabled']
+
+def reset():
+    """Forget the stages recorded so far in this thread"""
+    state = _state()
+    state['records'] = []
+    state['stack'] = []
+
+def records():
+    """Recorded stages in the order they started: dicts with stage, depth, wall_s, cpu_s and peak_mb"""
+    return list(_state()['records'])
+
+class _Stage:
+    __slots__ = ('name', 'state', 'record', 'wall_start', 'cpu_start', 'memory_start', 'peak')
+
+    def __init__(self, name, state):
+        self.name = name
+        self.state = state
+
+    def __enter__(self):
+        state = self.state
+        stack = state['stack']
+        self.record = {'stage': self.name, 'depth': len(stack), 'wall_s': None, 'cpu_s': None, 'peak_mb': None}
+        state['records'].append(self.record)
+
+        self.memory_start = None
+        if state['trace_memory'] and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The enclosing stage keeps the peak reached before ours resets it
+            if stack and stack[-1].memory_start is not None:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+            self.peak = current
+
+        stack.append(self)
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        stack = self.state['stack']
+        stack.pop()
+
+        self.record['wall_s'] = round(wall, 6)
+        self.record['cpu_s'] = round(cpu, 6)
+        if self.memory_start is not None and tracemalloc.is_tracing():
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            self.record['peak_mb'] = round((peak - self.memory_start) / (1024 * 1024), 3)
+            if stack and stack[-1].memory_start is not None:
+                stack[-1].peak = max(stack[-1].peak, peak)
+        return False
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name):
+    """Context manager timing one pipeline stage.
+
+    Records wall time, CPU time and the peak memory allocated on top of what
+    was in use when the stage started. When profiling is off it returns a
+    shared no-op context manager, so instrumented code pays next to nothing.
+    """
+    state = _state()
+    if not state['enabled']:
+        return _NULL_STAGE
+    return _Stage(name, state)
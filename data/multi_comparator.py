@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pandas as pd
+from data.xml_backend import get_backend, set_backend
+from data.xml_stream import content_stream, mapped_file
+from data.parsed_feed import ParsedFeed, as_feed, parse_feed_file
+from data.field_comparator import compare_field_structure
+from data.value_comparator import compare_matched_values
+from data.property_matcher import DEFAULT_KEY, match_properties
+from data.normalization import DEFAULT_NORMALIZER
+
+# The reference feed and normalizer of the current pool worker, set once by
+# _init_worker. Only pool workers use them; in-process comparisons get theirs
+# as arguments, so concurrent callers (web sessions) don't share them.
+_reference = None
+_normalizer = DEFAULT_NORMALIZER
+
+def load_candidate(candidate, backend=None):
+    """ParsedFeed for a candidate given as a ParsedFeed, raw XML bytes or a file
+    path, optionally paired with the member to read from a zip archive:
+    (bytes or path, member). Compressed feeds are decompressed while parsing."""
+    member = None
+    if isinstance(candidate, tuple):
+        candidate, member = candidate
+    if isinstance(candidate, (str, os.PathLike)):
+        with mapped_file(candidate) as mapping:
+            return parse_feed_file(content_stream(mapping, member), backend)
+    if isinstance(candidate, ParsedFeed):
+        return candidate
+    return parse_feed_file(content_stream(candidate, member), backend)
+
+def compare_with_reference(reference, candidate, name, reference_name='reference', match_key=DEFAULT_KEY,
+                           normalizer=DEFAULT_NORMALIZER, backend=None):
+    """Compare one candidate feed against an already parsed reference.
+
+    Returns the candidate's missing and extra fields (compare_field_structure
+    both ways round) and its field value mismatches on the properties matched
+    with the reference on match_key (compare_matched_values), summarised as
+    counts per field, plus the number of duplicate keys in the candidate.
+    normalizer sets how values are normalized and compared, backend which
+    parser reads the candidate (the process default when None).
+    """
+    feed = load_candidate(candidate, backend)
+
+    structure = compare_field_structure(reference, feed)
+    extra_fields = compare_field_structure(feed, reference)['missing_in_second_file']
+
+    match = match_properties(reference, feed, match_key)
+    mismatches = compare_matched_values(reference.properties, feed.properties, match, reference_name, name,
+                                        normalizer=normalizer)
+
+    return {
+        'file': name,
+        'total_properties': feed.property_count,
+        'matched_properties': len(match['rows1']),
+        'duplicate_keys': len(match['duplicates_in_second']),
+        'missing_fields': structure['missing_in_second_file'],
+        'extra_fields': extra_fields,
+        'value_mismatches': len(mismatches),
+        'mismatched_properties': mismatches['Key' if 'Key' in mismatches else 'Title'].nunique(),
+        'mismatches_by_field': mismatches['Field'].value_counts().to_dict()
+    }
+
+def _init_worker(reference, parser, normalizer):
+    # The reference is pickled to each worker once, not once per candidate, and
+    # the normalizer's memo of normalized values carries over between candidates
+    global _reference, _normalizer
+    _reference = reference
+    _normalizer = normalizer
+    set_backend(parser)
+
+def _compare_candidate(reference, candidate, name, reference_name, match_key, normalizer, backend=None):
+    # A broken candidate is reported in its own result instead of aborting the batch
+    try:
+        return compare_with_reference(reference, candidate, name, reference_name, match_key, normalizer, backend)
+    except Exception as e:
+        return {'file': name, 'total_properties': 0, 'error': str(e)}
+
+def _compare_in_worker(candidate, name, reference_name, match_key):
+    return _compare_candidate(_reference, candidate, name, reference_name, match_key, _normalizer)
+
+def compare_many(reference, candidates, names, reference_name='reference', workers=1, parser='auto', match_key=DEFAULT_KEY,
+                 normalizer=DEFAULT_NORMALIZER, mp_context=None):
+    """Compare any number of candidate feeds against one reference.
+
+    The reference (raw content or a ParsedFeed) is indexed once and shared by
+    every comparison; candidates (file paths, raw bytes or ParsedFeeds) are
+    parsed and compared in a process pool of `workers` processes, or in this
+    one when there is a single worker or candidate. Either way they are parsed
+    with the `parser` backend. Yields one result per candidate, in the order
+    of `candidates`. mp_context is the multiprocessing context the pool
+    starts its workers with (the platform default when None).
+    """
+    backend = get_backend(parser)
+    reference = as_feed(reference, backend)
+
+    if workers == 1 or len(candidates) < 2:
+        for candidate, name in zip(candidates, names):
+            yield _compare_candidate(reference, candidate, name, reference_name, match_key, normalizer, backend)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                             initargs=(reference, parser, normalizer)) as executor:
+        yield from executor.map(_compare_in_worker, candidates, names, repeat(reference_name), repeat(match_key))
+
+def presence_matrix(reference, results):
+    """Fields x feeds table: ✓ where a feed has a reference field, ✗ where it is
+    missing. Extra fields found in any feed are listed after the reference's
+    fields, marked ✓ only in the feeds that have them."""
+    reference_fields = reference.field_structure() if isinstance(reference, ParsedFeed) else list(reference)
+    extra_fields = sorted({field for result in results for field in result.get('extra_fields', ())})
+
+    columns = {}
+    for result in results:
+        if 'error' in result:
+            columns[result['file']] = ['?'] * (len(reference_fields) + len(extra_fields))
+            continue
+        missing = set(result['missing_fields'])
+        extra = set(result['extra_fields'])
+        columns[result['file']] = (['✗' if field in missing else '✓' for field in reference_fields]
+                                   + ['✓' if field in extra else '' for field in extra_fields])
+
+    index = pd.Index(reference_fields + extra_fields, name='Field')
+    matrix = pd.DataFrame(columns, index=index)
+    matrix.insert(0, 'In Reference', ['✓'] * len(reference_fields) + [''] * len(extra_fields))
+    return matrix
+
+def mismatch_summary(results):
+    """One row per feed with its property, missing field and value mismatch counts"""
+    return pd.DataFrame([{
+        'File': result['file'],
+        'Properties': result['total_properties'],
+        'Matched Properties': result.get('matched_properties', 0),
+        'Duplicate Keys': result.get('duplicate_keys', 0),
+        'Missing Fields': len(result.get('missing_fields', ())),
+        'Extra Fields': len(result.get('extra_fields', ())),
+        'Value Mismatches': result.get('value_mismatches', 0),
+        'Mismatched Properties': result.get('mismatched_properties', 0),
+        'Error': result.get('error', '')
+    } for result in results])
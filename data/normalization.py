@@ -0,0 +1,179 @@
+import re
+import html
+import math
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+# Distinct raw values whose normalized form each Normalizer remembers
+NORMALIZE_CACHE_SIZE = 1 << 18
+
+ENTITY_MODES = ('basic', 'full', 'none')
+NUMERIC_MODES = ('float', 'tolerance', 'decimal', 'text')
+
+# The handful of entities the original normalize_value decoded
+_BASIC_ENTITIES = (('&#x20AC;', '€'), ('&#xA0;', ' '), ('&lt;', '<'), ('&gt;', '>'))
+_WHITESPACE = re.compile(r'\s+')
+
+# ASCII first characters of anything float() or Decimal() accept (digits, sign,
+# point, inf/infinity/nan); other ASCII text skips the raised and caught
+# conversion error. Non-ASCII digits (e.g. Arabic-Indic) still go through.
+_NUMBER_START = frozenset('0123456789+-.iInNsS')
+
+class Normalizer:
+    """How cell values are made comparable, compiled once and memoized.
+
+    entities: 'basic' decodes the few entities feeds used to carry (&#x20AC;,
+    &#xA0;, &lt;, &gt;), 'full' decodes every HTML entity and character
+    reference, 'none' leaves text as is. collapse_whitespace turns runs of
+    whitespace inside a value into one space (values are always stripped).
+
+    numeric decides when two values that both read as numbers are equal:
+    'float' compares them as floats, 'tolerance' treats them as equal when
+    they differ by at most tolerance, 'decimal' compares them exactly as
+    decimals (1.10 equals 1.1, but 0.1000000000000000001 doesn't equal 0.1),
+    and 'text' compares every value as text.
+
+    The pipeline is picked once when the Normalizer is created, and
+    normalize() remembers the result for up to cache_size distinct raw
+    values, so a value repeated across a feed (Status, Type, VAT) is
+    normalized and cast once per process rather than once per cell.
+    """
+
+    def __init__(self, entities='basic', collapse_whitespace=False, numeric='float', tolerance=0.0,
+                 cache_size=NORMALIZE_CACHE_SIZE):
+        if entities not in ENTITY_MODES:
+            raise ValueError(f"Unknown entity mode {entities!r}, expected one of {', '.join(ENTITY_MODES)}")
+        if numeric not in NUMERIC_MODES:
+            raise ValueError(f"Unknown numeric mode {numeric!r}, expected one of {', '.join(NUMERIC_MODES)}")
+        if tolerance < 0:
+            raise ValueError("The numeric tolerance can't be negative")
+        self.entities = entities
+        self.collapse_whitespace = collapse_whitespace
+        self.numeric = numeric
+        self.tolerance = float(tolerance)
+        self.cache_size = cache_size
+        self._compile()
+
+    def _compile(self):
+        steps = []
+        if self.entities == 'basic':
+            steps.append(_decode_basic_entities)
+        elif self.entities == 'full':
+            steps.append(_decode_all_entities)
+        if self.collapse_whitespace:
+            steps.append(_collapse_whitespace)
+        number = {'float': _to_float, 'tolerance': _to_float, 'decimal': _to_decimal_key, 'text': _no_number}[self.numeric]
+
+        # The steps are chained here, once, so a value doesn't loop over them
+        if not steps:
+            def normalize(value):
+                if value is None:
+                    return '', None
+                value = value.strip()
+                return value, number(value)
+        elif len(steps) == 1:
+            step = steps[0]
+
+            def normalize(value):
+                if value is None:
+                    return '', None
+                value = step(value.strip())
+                return value, number(value)
+        else:
+            def normalize(value):
+                if value is None:
+                    return '', None
+                value = value.strip()
+                for step in steps:
+                    value = step(value)
+                return value, number(value)
+
+        self.normalize = lru_cache(maxsize=self.cache_size)(normalize)
+        self.normalize.__doc__ = """(normalized text, numeric key) of a raw value (None for an
+        empty element). The numeric key is a float, or a canonical decimal
+        string in decimal mode, or None when the value isn't a number."""
+
+    def key(self):
+        """Stable description of the settings, for cache keys"""
+        return (self.entities, self.collapse_whitespace, self.numeric, self.tolerance)
+
+    def options(self):
+        return {'entities': self.entities, 'collapse_whitespace': self.collapse_whitespace,
+                'numeric': self.numeric, 'tolerance': self.tolerance}
+
+    def numbers_differ(self, numbers1, numbers2):
+        """Element-wise mismatch of two arrays of numeric values (see encode_values)"""
+        if self.numeric == 'tolerance':
+            return abs(numbers1 - numbers2) > self.tolerance
+        return numbers1 != numbers2
+
+    # The memo can't be pickled; a copy sent to a worker process compiles its own
+    def __getstate__(self):
+        return {**self.options(), 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __eq__(self, other):
+        return isinstance(other, Normalizer) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f'Normalizer({", ".join(f"{name}={value!r}" for name, value in self.options().items())})'
+
+def _decode_basic_entities(value):
+    if '&' not in value:
+        return value
+    for entity, character in _BASIC_ENTITIES:
+        value = value.replace(entity, character)
+    return value
+
+def _decode_all_entities(value):
+    # html.unescape also decodes &nbsp; to U+00A0, which strip() and \s treat as whitespace
+    return html.unescape(value).strip() if '&' in value else value
+
+def _collapse_whitespace(value):
+    return _WHITESPACE.sub(' ', value)
+
+def _to_float(value):
+    if not value or (value[0] < '\x80' and value[0] not in _NUMBER_START):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    # NaN never equals itself, so it is compared as text
+    return None if math.isnan(number) else number
+
+def _to_decimal_key(value):
+    if not value or (value[0] < '\x80' and value[0] not in _NUMBER_START):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        return None
+    if number.is_nan():
+        return None
+    # normalize() drops trailing zeros, so 1.10 and 1.1 share a key
+    return str(number.normalize()) if number else '0'
+
+def _no_number(value):
+    return None
+
+@lru_cache(maxsize=16)
+def get_normalizer(entities='basic', collapse_whitespace=False, numeric='float', tolerance=0.0):
+    """Normalizer for these settings, shared by every caller in the process so
+    it is compiled once and its memo is reused from one comparison to the next"""
+    return Normalizer(entities, collapse_whitespace, numeric, tolerance)
+
+DEFAULT_NORMALIZER = get_normalizer()
+
+def build_normalizer(options=None):
+    """Shared Normalizer for a dict of options (e.g. from a request), the default one for None"""
+    if not options:
+        return DEFAULT_NORMALIZER
+    if isinstance(options, Normalizer):
+        return options
+    return get_normalizer(**options)
@@ -0,0 +1,55 @@
+from data.xml_stream import content_stream, iter_properties
+from data.property_store import PropertyStore
+
+class ParsedFeed:
+    """Everything the comparison modes need from one XML feed, collected in a single parse.
+
+    properties: Title -> {tag: text} for every titled <property> (later titles win),
+                held in a compact PropertyStore with dict-like access. The store
+                also keeps every <property> as a numbered row for key matching.
+    tags:       every child tag seen on any <property>, titled or not
+    titles:     set of property titles, kept alongside the map so set operations
+                don't have to rebuild it on every comparison
+    """
+
+    def __init__(self):
+        self.properties = PropertyStore()
+        self.tags = set()
+        self.titles = set()
+        self.property_count = 0
+
+    def field_structure(self):
+        """Sorted list of unique field names, as returned by extract_field_structure"""
+        return sorted(self.tags)
+
+def parse_feed(xml_content, backend=None):
+    """Parse an XML feed once and index its properties, tags and titles.
+    xml_content is raw bytes (preferred, the encoding is detected by the parser) or str."""
+    return parse_feed_file(content_stream(xml_content), backend)
+
+def parse_feed_file(source, backend=None):
+    """Build a ParsedFeed from a file path or file object, streaming one
+    <property> at a time instead of building the whole DOM. backend is the
+    parser backend to use, the process default when None."""
+    feed = ParsedFeed()
+
+    for property in iter_properties(source, backend=backend):
+        feed.property_count += 1
+        title_element = property.find('Title')
+        items = [(child.tag, child.text) for child in property]
+        feed.tags.update(tag for tag, _ in items)
+
+        title = title_element.text if title_element is not None else None
+        # Untitled properties are stored too, for matching on other keys
+        feed.properties.add(title, items)
+        if title:
+            feed.titles.add(title)
+
+    feed.properties.seal()
+    return feed
+
+def as_feed(xml_content_or_feed, backend=None):
+    """Accept either raw XML content or an already parsed feed"""
+    if isinstance(xml_content_or_feed, ParsedFeed):
+        return xml_content_or_feed
+    return parse_feed(xml_content_or_feed, backend)
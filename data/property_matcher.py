@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_KEY = 'Title'
+
+# Above this many properties (both feeds together) the matcher switches from a
+# dict-based hash join to a sort-merge join over integer key codes, which
+# needs a few bytes per property instead of a Python dict entry
+HASH_JOIN_MAX_ROWS = 1000000
+
+def parse_key(key):
+    """Key fields from 'Title', 'Project+Unit_Number' or a list of field names"""
+    fields = key.split('+') if isinstance(key, str) else list(key)
+    fields = tuple(field.strip() for field in fields if field.strip())
+    if not fields:
+        raise ValueError("The match key needs at least one field")
+    return fields
+
+def key_label(key_fields):
+    return '+'.join(key_fields)
+
+def property_keys(store, key_fields):
+    """Match key of every row of a PropertyStore: the field's text, or a tuple of
+    texts for a composite key. None when a key field is missing or empty."""
+    columns = [store.column(field) for field in key_fields]
+    if len(columns) == 1:
+        return [value or None for value in columns[0]]
+    return [parts if all(parts) else None for parts in zip(*columns)]
+
+def _display_key(key):
+    return ' / '.join(key) if isinstance(key, tuple) else key
+
+def hash_join(keys1, keys2):
+    """Match rows of two feeds on equal keys with a dict index per feed.
+    Returns (pairs, only_in_first, only_in_second, duplicates1, duplicates2,
+    unkeyed1, unkeyed2); pairs are (key, row1, row2) sorted by key."""
+    index1, duplicates1, unkeyed1 = _index(keys1)
+    index2, duplicates2, unkeyed2 = _index(keys2)
+
+    pairs = []
+    only_in_first = []
+    for key, row1 in index1.items():
+        row2 = index2.get(key)
+        if row2 is None:
+            only_in_first.append(key)
+        elif row1 >= 0 and row2 >= 0:
+            pairs.append((key, row1, row2))
+    only_in_second = [key for key in index2 if key not in index1]
+
+    pairs.sort()
+    return pairs, sorted(only_in_first), sorted(only_in_second), duplicates1, duplicates2, unkeyed1, unkeyed2
+
+def _index(keys):
+    # key -> row, or -1 once the key has been seen more than once
+    index = {}
+    duplicates = {}
+    unkeyed = 0
+    for row, key in enumerate(keys):
+        if key is None:
+            unkeyed += 1
+        elif key in index:
+            index[key] = -1
+            duplicates[key] = duplicates.get(key, 1) + 1
+        else:
+            index[key] = row
+    return index, duplicates, unkeyed
+
+def _key_codes(keys1, keys2):
+    """Order-preserving integer codes for the keys of both feeds (-1 for None).
+    Composite keys are coded field by field and combined, so tuples never
+    have to be hashed or compared in Python."""
+    count1 = len(keys1)
+    parts = list(zip(*[key if isinstance(key, tuple) else (key,) for key in keys1 + keys2
+                       if key is not None])) or [()]
+    present = np.array([key is not None for key in keys1 + keys2], dtype=bool)
+
+    combined = np.zeros(int(present.sum()), dtype=np.int64)
+    for part in parts:
+        codes, part_uniques = pd.factorize(np.array(part, dtype=object), sort=True)
+        # Re-factorizing keeps the combined codes dense, so they can't overflow
+        combined = pd.factorize(combined * len(part_uniques) + codes, sort=True)[0].astype(np.int64)
+
+    codes = np.full(len(present), -1, dtype=np.int64)
+    codes[present] = combined
+    return codes[:count1], codes[count1:]
+
+def sort_merge_join(keys1, keys2):
+    """hash_join for very large feeds: keys become sorted integer codes, each
+    feed's codes are sorted once and the two sorted runs are merged. Same
+    result as hash_join."""
+    codes1, codes2 = _key_codes(keys1, keys2)
+
+    order1 = np.argsort(codes1, kind='stable')
+    order2 = np.argsort(codes2, kind='stable')
+    sorted1, sorted2 = codes1[order1], codes2[order2]
+    unique1, first1, counts1 = np.unique(sorted1, return_index=True, return_counts=True)
+    unique2, first2, counts2 = np.unique(sorted2, return_index=True, return_counts=True)
+
+    # Key code -1 marks properties without a key
+    unkeyed1 = int(counts1[0]) if len(unique1) and unique1[0] == -1 else 0
+    unkeyed2 = int(counts2[0]) if len(unique2) and unique2[0] == -1 else 0
+    keep1, keep2 = unique1 >= 0, unique2 >= 0
+    unique1, first1, counts1 = unique1[keep1], first1[keep1], counts1[keep1]
+    unique2, first2, counts2 = unique2[keep2], first2[keep2], counts2[keep2]
+
+    common, positions1, positions2 = np.intersect1d(unique1, unique2, assume_unique=True, return_indices=True)
+    single = (counts1[positions1] == 1) & (counts2[positions2] == 1)
+    rows1 = order1[first1[positions1[single]]]
+    rows2 = order2[first2[positions2[single]]]
+
+    duplicates1 = {keys1[order1[first]]: int(count) for first, count in zip(first1, counts1) if count > 1}
+    duplicates2 = {keys2[order2[first]]: int(count) for first, count in zip(first2, counts2) if count > 1}
+    only_codes1 = np.setdiff1d(unique1, unique2, assume_unique=True)
+    only_codes2 = np.setdiff1d(unique2, unique1, assume_unique=True)
+    only_in_first = [keys1[row] for row in order1[first1[np.searchsorted(unique1, only_codes1)]]]
+    only_in_second = [keys2[row] for row in order2[first2[np.searchsorted(unique2, only_codes2)]]]
+
+    pairs = [(keys1[row1], int(row1), int(row2)) for row1, row2 in zip(rows1, rows2)]
+    return pairs, only_in_first, only_in_second, duplicates1, duplicates2, unkeyed1, unkeyed2
+
+def match_properties(feed1, feed2, key=DEFAULT_KEY, method='auto'):
+    """
+    Pair up the properties of two ParsedFeeds on a (possibly composite) key.
+
+    Keys that occur more than once in either feed are reported as duplicates
+    and left out of the pairs, instead of one record silently replacing
+    another. method is 'hash', 'sort-merge' or 'auto' (hash join up to
+    HASH_JOIN_MAX_ROWS properties). Returns a dict with the matched rows
+    (rows1/rows2, aligned, sorted by key), their display keys, the keys found
+    in only one feed, the duplicate keys with their counts and the number of
+    properties per feed that lack the key.
+    """
+    key_fields = parse_key(key)
+    keys1 = property_keys(feed1.properties, key_fields)
+    keys2 = property_keys(feed2.properties, key_fields)
+
+    if method == 'auto':
+        method = 'hash' if len(keys1) + len(keys2) <= HASH_JOIN_MAX_ROWS else 'sort-merge'
+    if method == 'hash':
+        result = hash_join(keys1, keys2)
+    elif method == 'sort-merge':
+        result = sort_merge_join(keys1, keys2)
+    else:
+        raise ValueError(f"Unknown join method: {method}")
+    pairs, only_in_first, only_in_second, duplicates1, duplicates2, unkeyed1, unkeyed2 = result
+
+    keys = np.empty(len(pairs), dtype=object)
+    keys[:] = [_display_key(key) for key, _, _ in pairs]
+    return {
+        'key_fields': key_fields,
+        'method': method,
+        'rows1': np.array([row1 for _, row1, _ in pairs], dtype=np.int64),
+        'rows2': np.array([row2 for _, _, row2 in pairs], dtype=np.int64),
+        'keys': keys,
+        'only_in_first': [_display_key(key) for key in only_in_first],
+        'only_in_second': [_display_key(key) for key in only_in_second],
+        'duplicates_in_first': {_display_key(key): count for key, count in duplicates1.items()},
+        'duplicates_in_second': {_display_key(key): count for key, count in duplicates2.items()},
+        'unkeyed_first': unkeyed1,
+        'unkeyed_second': unkeyed2
+    }
+
+def match_summary(match):
+    """match_properties result without the per-pair arrays"""
+    return {name: value for name, value in match.items() if name not in ('rows1', 'rows2', 'keys')}
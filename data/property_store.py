@@ -0,0 +1,205 @@
+import sys
+from array import array
+from collections.abc import Mapping
+import numpy as np
+
+class PropertyStore(Mapping):
+    """Compact Title -> property map for a parsed feed.
+
+    Every property is kept as a numbered row, including untitled ones and
+    earlier properties whose title was reused, so they can still be matched
+    on other keys (see data/property_matcher.py). Rows are stored column-major: one array of 32-bit value codes per
+    field (tag), in the order the tags were first seen in the feed, with -1
+    where a property has no such element. Values are dictionary-encoded, so
+    repeated values such as Status or VAT are kept once per feed instead of
+    once per property, and tags are interned. Looking a title up returns a
+    read-only PropertyRow view that behaves like the {tag: text} dict it
+    replaces.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._tags = []
+        self._tag_index = {}
+        self._columns = []
+        self._values = []
+        self._codes = {}
+        self._row_count = 0
+        self._value_array = None
+
+    def add(self, title, items):
+        """Store a property's (tag, text) pairs as a new row and map title to it.
+        A later property with the same title takes over the title lookup, as
+        dict assignment would, but the earlier row is kept. Returns the row."""
+        tag_index = self._tag_index
+        value_codes = self._codes
+        values = self._values
+        codes = [-1] * len(self._columns)
+        for tag, text in items:
+            index = tag_index.get(tag)
+            if index is None:
+                index = self._add_column(tag)
+                codes.append(-1)
+            code = value_codes.get(text)
+            if code is None:
+                code = value_codes[text] = len(values)
+                values.append(text)
+            codes[index] = code
+        for column, code in zip(self._columns, codes):
+            column.append(code)
+        row = self._row_count
+        self._row_count += 1
+        if title:
+            self._rows[title] = row
+        return row
+
+    def _add_column(self, tag):
+        tag = sys.intern(tag)
+        self._tag_index[tag] = len(self._tags)
+        self._tags.append(tag)
+        # Earlier rows don't have the new field
+        self._columns.append(array('i', [-1]) * self._row_count)
+        return len(self._tags) - 1
+
+    def seal(self):
+        """Drop the value -> code lookup once parsing is done; it is only needed
+        while adding properties and would otherwise be kept (and pickled) for
+        every distinct value."""
+        self._codes = None
+
+    # The object array of values is rebuilt on load rather than pickled alongside the list
+    def __getstate__(self):
+        return {**self.__dict__, '_value_array': None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._value_array = None
+
+    def _values_as_array(self):
+        values = self._value_array
+        if values is None or len(values) != len(self._values):
+            values = np.empty(len(self._values), dtype=object)
+            values[:] = self._values
+            # Kept once sealed, when no more values can be added
+            if self._codes is None:
+                self._value_array = values
+        return values
+
+    def value(self, row, tag, default=None):
+        index = self._tag_index.get(tag)
+        if index is None:
+            return default
+        code = self._columns[index][row]
+        return default if code < 0 else self._values[code]
+
+    @property
+    def row_count(self):
+        return self._row_count
+
+    def row(self, row):
+        """{tag: text} view of a row by number"""
+        return PropertyRow(self, row)
+
+    def rows_for(self, titles):
+        """Row numbers of the given titles, -1 for titles not in the store"""
+        return np.array([self._rows.get(title, -1) for title in titles], dtype=np.int64)
+
+    def column(self, tag, missing=None):
+        """Values of one tag for every row, with missing where a row lacks it"""
+        return self.grid(np.arange(self._row_count), [tag], missing)[:, 0]
+
+    def _codes_for(self, rows, tags):
+        """rows x tags matrix of value codes; -1 where absent, and for unknown (-1) rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        matrix = np.full((len(rows), len(tags)), -1, dtype=np.int64)
+        known = rows >= 0
+        for position, tag in enumerate(tags):
+            index = self._tag_index.get(tag)
+            if index is not None:
+                matrix[known, position] = np.frombuffer(self._columns[index], dtype=np.int32)[rows[known]]
+        return matrix
+
+    def tags_present(self, rows):
+        """Tags that at least one of the given rows has, in column order"""
+        codes = self._codes_for(rows, self._tags)
+        return [tag for tag, present in zip(self._tags, (codes >= 0).any(axis=0)) if present]
+
+    def coded_grid(self, rows, tags, missing=None):
+        """grid() before its codes are looked up: (codes, values), a rows x tags
+        array of codes into values, an object array of just the distinct values
+        the grid holds followed by missing"""
+        codes = self._codes_for(rows, tags)
+        # -1 (absent) marks the last slot, which stands for missing
+        present = np.zeros(len(self._values) + 1, dtype=bool)
+        present[codes] = True
+        used = np.flatnonzero(present[:-1])
+        lookup = np.empty(len(present), dtype=np.int64)
+        lookup[used] = np.arange(len(used))
+        lookup[-1] = len(used)
+
+        values = np.empty(len(used) + 1, dtype=object)
+        values[:-1] = self._values_as_array()[used]
+        values[-1] = missing
+        return lookup[codes], values
+
+    def grid(self, rows, tags, missing=None):
+        """rows x tags object array of values, with missing where a property
+        lacks the tag (or the row is -1). Equivalent to
+        [[store.row(row).get(tag, missing) for tag in tags] for row in rows]
+        but gathered column by column with NumPy."""
+        codes, values = self.coded_grid(rows, tags, missing)
+        return values[codes]
+
+    def __getitem__(self, title):
+        return PropertyRow(self, self._rows[title])
+
+    def get(self, title, default=None):
+        row = self._rows.get(title)
+        return default if row is None else PropertyRow(self, row)
+
+    def __contains__(self, title):
+        return title in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def keys(self):
+        return self._rows.keys()
+
+    def __repr__(self):
+        return f'<PropertyStore: {self._row_count} properties ({len(self)} titled), {len(self._tags)} fields, {len(self._values)} distinct values>'
+
+class PropertyRow(Mapping):
+    """Read-only {tag: text} view of one property in a PropertyStore"""
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def get(self, tag, default=None):
+        return self._store.value(self._row, tag, default)
+
+    def __getitem__(self, tag):
+        value = self._store.value(self._row, tag, _MISSING)
+        if value is _MISSING:
+            raise KeyError(tag)
+        return value
+
+    def __iter__(self):
+        row = self._row
+        for tag, column in zip(self._store._tags, self._store._columns):
+            if column[row] >= 0:
+                yield tag
+
+    def __len__(self):
+        row = self._row
+        return sum(1 for column in self._store._columns if column[row] >= 0)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+_MISSING = object()
@@ -0,0 +1,177 @@
+from data.xml_backend import get_backend
+from data.xml_stream import content_stream, iter_properties, mapped_file
+
+# Value types a rule can require, checked against the stripped element text
+FIELD_TYPES = ('string', 'number', 'integer', 'boolean')
+_BOOLEAN_VALUES = {'true', 'false', '1', '0', 'yes', 'no'}
+
+class Rule:
+    """One required field of a property.
+
+    path is relative to the <property> element, e.g. 'Title' or 'gallery/image'.
+    A property satisfies the rule when at least one element at that path
+    passes the constraints; a property that has the element but none passing
+    is counted as invalid rather than missing.
+    """
+    __slots__ = ('path', 'type', 'non_empty')
+
+    def __init__(self, path, type='string', non_empty=False):
+        if type not in FIELD_TYPES:
+            raise ValueError(f"Unknown type {type!r} for required field {path!r}, expected one of {', '.join(FIELD_TYPES)}")
+        self.path = path
+        self.type = type
+        self.non_empty = non_empty
+
+    @property
+    def constrained(self):
+        return self.non_empty or self.type != 'string'
+
+    def accepts(self, element):
+        text = (element.text or '').strip()
+        if not text:
+            if self.type != 'string':
+                return False
+            # A container such as <gallery> counts as non-empty when it has children
+            return not self.non_empty or len(element) > 0
+        if self.type == 'number':
+            try:
+                float(text)
+            except ValueError:
+                return False
+        elif self.type == 'integer':
+            try:
+                int(text)
+            except ValueError:
+                return False
+        elif self.type == 'boolean':
+            return text.lower() in _BOOLEAN_VALUES
+        return True
+
+    def spec(self):
+        if not self.constrained:
+            return self.path
+        return {'field': self.path, 'type': self.type, 'non_empty': self.non_empty}
+
+class _Node:
+    """Path trie node: the rules ending at this tag and the tags below it that rules go on to"""
+    __slots__ = ('rules', 'children')
+
+    def __init__(self):
+        self.rules = []
+        self.children = {}
+
+class RuleSet:
+    """required_fields compiled into a tag trie, so each property is checked in
+    one walk over its children instead of one find() per required field"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.fields = [rule.path for rule in self.rules]
+        self._root = _Node()
+        for index, rule in enumerate(self.rules):
+            node = self._root
+            for tag in rule.path.split('/'):
+                node = node.children.setdefault(tag, _Node())
+            node.rules.append(index)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def key(self):
+        """Stable description of the rules, for cache keys"""
+        return tuple(repr(rule.spec()) for rule in self.rules)
+
+    def check_property(self, property, found, valid):
+        """Mark in found/valid (one flag per rule) which rules the property meets"""
+        rules = self.rules
+        stack = [(property, self._root)]
+        while stack:
+            element, node = stack.pop()
+            for child in element:
+                child_node = node.children.get(child.tag)
+                if child_node is None:
+                    continue
+                for index in child_node.rules:
+                    found[index] = 1
+                    if not valid[index] and rules[index].accepts(child):
+                        valid[index] = 1
+                if child_node.children:
+                    stack.append((child, child_node))
+
+    def check(self, source, backend=None):
+        """Stream the <property> elements of a file path or file object and count,
+        per rule, the properties missing the field and those failing its constraints.
+        backend is the parser backend to use, the process default when None."""
+        count = len(self.rules)
+        missing = [0] * count
+        invalid = [0] * count
+        total_properties = 0
+
+        for property in iter_properties(source, backend=backend):
+            total_properties += 1
+            found = bytearray(count)
+            valid = bytearray(count)
+            self.check_property(property, found, valid)
+            for index in range(count):
+                if not found[index]:
+                    missing[index] += 1
+                elif not valid[index]:
+                    invalid[index] += 1
+
+        return {
+            'total_properties': total_properties,
+            'missing_fields_counts': dict(zip(self.fields, missing)),
+            'invalid_fields_counts': {field: invalid_count for field, invalid_count, rule
+                                      in zip(self.fields, invalid, self.rules) if rule.constrained}
+        }
+
+def compile_rules(required_fields):
+    """Compile the "required_fields" list of required_fields.json.
+
+    Each entry is a field path ("Title", "gallery/image") or an object such as
+    {"field": "Price", "type": "number", "non_empty": true}. An already
+    compiled RuleSet is returned as is.
+    """
+    if isinstance(required_fields, RuleSet):
+        return required_fields
+
+    rules = []
+    seen = set()
+    for entry in required_fields:
+        if isinstance(entry, str):
+            rules.append(Rule(entry.strip('/')))
+        elif isinstance(entry, dict) and 'field' in entry:
+            rules.append(Rule(entry['field'].strip('/'), entry.get('type', 'string'), bool(entry.get('non_empty', False))))
+        else:
+            raise ValueError(f"Invalid required field entry: {entry!r}")
+        if rules[-1].path in seen:
+            raise ValueError(f"Required field {rules[-1].path!r} is listed more than once")
+        seen.add(rules[-1].path)
+    return RuleSet(rules)
+
+def check_feed_file(path, rules, member=None, parser='auto'):
+    """RuleSet.check of one feed file, or of a member of a zip archive, parsed with
+    the parser backend choice. Meant for pool workers, which get the file's path
+    rather than its bytes: a broken feed is reported in the result's 'error'
+    instead of failing the batch."""
+    try:
+        with mapped_file(path) as mapping:
+            return rules.check(content_stream(mapping, member), get_backend(parser))
+    except Exception as e:
+        return {'total_properties': 0, 'missing_fields_counts': {}, 'error': str(e)}
+
+def field_report(result):
+    """Per-field rows of a check() result with counts and percentages of the property count"""
+    total = result['total_properties']
+    invalid_counts = result.get('invalid_fields_counts', {})
+    rows = []
+    for field, missing in result['missing_fields_counts'].items():
+        invalid = invalid_counts.get(field, 0)
+        rows.append({
+            'Field': field,
+            'Missing': missing,
+            'Missing %': round(missing / total * 100, 1) if total else 0.0,
+            'Invalid': invalid,
+            'Invalid %': round(invalid / total * 100, 1) if total else 0.0
+        })
+    return rows
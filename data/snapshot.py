@@ -0,0 +1,137 @@
+import os
+import zlib
+import time
+import pickle
+import hashlib
+import tempfile
+from data.value_comparator import compare_field_values
+from data.normalization import DEFAULT_NORMALIZER
+from data.property_matcher import _display_key, parse_key, property_keys
+
+# Bump whenever the snapshot layout or property_hash changes
+SNAPSHOT_VERSION = 2
+
+def property_hash(values):
+    """Digest of one property's fields, independent of their order in the XML"""
+    digest = hashlib.blake2b(digest_size=12)
+    for tag, text in sorted(values.items()):
+        digest.update(tag.encode('utf-8'))
+        digest.update(b'\x1f')
+        # Keep an empty element (None) distinct from an empty string
+        digest.update(b'\x00' if text is None else text.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\x1e')
+    return digest.digest()
+
+def snapshot_entries(feed, key_field='Title'):
+    """Index every property of a ParsedFeed, titled or not, on key_field (one
+    field or a composite key such as Project+Unit_Number).
+
+    Returns (entries, duplicates, unkeyed): key -> (hash, values) for the keys
+    found on exactly one property, {key: count} of the keys found on several
+    and the number of properties without the key. As in
+    property_matcher.match_properties, duplicates are reported and left out
+    rather than one property silently replacing another.
+    """
+    store = feed.properties
+    entries = {}
+    duplicates = {}
+    unkeyed = 0
+    for row, key in enumerate(property_keys(store, parse_key(key_field))):
+        if key is None:
+            unkeyed += 1
+            continue
+        key = _display_key(key)
+        if key in duplicates:
+            duplicates[key] += 1
+        elif key in entries:
+            del entries[key]
+            duplicates[key] = 2
+        else:
+            values = dict(store.row(row))
+            entries[key] = (property_hash(values), values)
+    return entries, duplicates, unkeyed
+
+def build_snapshot(feed, file_name, key_field='Title'):
+    entries, duplicates, unkeyed = snapshot_entries(feed, key_field)
+    return {
+        'version': SNAPSHOT_VERSION,
+        'file': file_name,
+        'key_field': key_field,
+        'created': time.time(),
+        'entries': entries,
+        'duplicates': duplicates,
+        'unkeyed': unkeyed
+    }
+
+def snapshot_path(snapshot_dir, file_name):
+    return os.path.join(snapshot_dir, f'{os.path.basename(file_name)}.snapshot')
+
+def save_snapshot(snapshot, path):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temp_path, path)
+
+def load_snapshot(path):
+    """Load a stored snapshot, or None if there is none (or it is from an older version)"""
+    try:
+        with open(path, 'rb') as file:
+            snapshot = pickle.loads(zlib.decompress(file.read()))
+    except FileNotFoundError:
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+def diff_against_snapshot(snapshot, feed, file_name, normalizer=DEFAULT_NORMALIZER):
+    """Diff a new feed against a stored snapshot of an earlier version.
+
+    Properties are matched on the snapshot's key field. Only keys whose
+    property hash changed go through the field-level compare_field_values, so
+    the cost of the diff follows the number of changed properties rather than
+    the size of the feed. Keys found on several properties in either version
+    are reported as duplicates and not compared. Returns the added, removed
+    and changed keys, the number of unchanged properties, the duplicate keys
+    and unkeyed property counts of both versions, the field value mismatches
+    (with a Key column when the key field isn't Title) and the new snapshot
+    to store for the next run.
+    """
+    key_field = snapshot['key_field']
+    new_snapshot = build_snapshot(feed, file_name, key_field)
+    old_entries = snapshot['entries']
+    new_entries = new_snapshot['entries']
+    old_keys = old_entries.keys() | snapshot['duplicates'].keys()
+    new_keys = new_entries.keys() | new_snapshot['duplicates'].keys()
+
+    common_keys = old_entries.keys() & new_entries.keys()
+    changed = [key for key in common_keys if old_entries[key][0] != new_entries[key][0]]
+
+    previous_name = f"{snapshot['file']} (snapshot)"
+    field_value_mismatches = compare_field_values(
+        {key: old_entries[key][1] for key in changed},
+        {key: new_entries[key][1] for key in changed},
+        changed, previous_name, file_name, normalizer
+    )
+    if key_field != 'Title':
+        # As in compare_matched_values: the match key in a Key column, the
+        # property's own title (the previous one, else the current one) in Title
+        keys = field_value_mismatches['Title']
+        titles = {key: old_entries[key][1].get('Title') or new_entries[key][1].get('Title') for key in changed}
+        field_value_mismatches.insert(field_value_mismatches.columns.get_loc('Title'), 'Key', keys)
+        field_value_mismatches['Title'] = keys.map(titles)
+
+    return {
+        'key_field': key_field,
+        'added': sorted(new_keys - old_keys),
+        'removed': sorted(old_keys - new_keys),
+        'changed': sorted(changed),
+        'unchanged_count': len(common_keys) - len(changed),
+        'duplicates_in_previous': snapshot['duplicates'],
+        'duplicates_in_current': new_snapshot['duplicates'],
+        'unkeyed_previous': snapshot['unkeyed'],
+        'unkeyed_current': new_snapshot['unkeyed'],
+        'field_value_mismatches': field_value_mismatches,
+        'snapshot': new_snapshot
+    }
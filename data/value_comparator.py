@@ -1,24 +1,17 @@
+import numpy as np
 import pandas as pd
+from data.property_store import PropertyStore
+from data.normalization import DEFAULT_NORMALIZER
 
-def normalize_value(value):
-    """
-    Return an empty string if the value is None
-    """
-    if value is None:
-        return ""
+# Placeholder used when a property has no element for a field at all
+NOT_PRESENT = 'Not Present'
 
+def normalize_value(value):
     """
-    Normalize values by removing extra whitespace, special characters, and converting HTML entities.
+    Normalize a value with the default settings: strip surrounding whitespace
+    and decode the common HTML entities. Returns an empty string for None.
     """
-    # Remove leading and trailing whitespace
-    value = value.strip()
-
-    # Handle HTML entities and special characters if necessary
-    # For example, replace HTML entities with their corresponding characters
-    # This can be expanded as needed
-    value = value.replace('&#x20AC;', '€').replace('&#xA0;', ' ').replace('&lt;', '<').replace('&gt;', '>')
-
-    return value
+    return DEFAULT_NORMALIZER.normalize(value)[0]
 
 def convert_to_numeric(value):
     """
@@ -31,49 +24,211 @@ def convert_to_numeric(value):
         # Return None if conversion fails
         return None
 
-def compare_field_values(fields1, fields2, common_titles, file1_name, file2_name):
-    mismatches = []
-    
-    for title in common_titles:
-        property1 = fields1.get(title, {})
-        property2 = fields2.get(title, {})
-        
-        # Get all unique fields across both properties
-        all_fields = set(property1.keys()) | set(property2.keys())
-        
-        for field in all_fields:
-            # Normalize values
-            value1 = normalize_value(property1.get(field, 'Not Present'))
-            value2 = normalize_value(property2.get(field, 'Not Present'))
-            
-            ref1 = property1.get('Property_Reference', 'Not Present')
-            ref2 = property2.get('Property_Reference', 'Not Present')
-            
-            # Convert to numeric values for comparison if possible
-            numeric_value1 = convert_to_numeric(value1)
-            numeric_value2 = convert_to_numeric(value2)
-            
-            seen_titles = set()
-            
-            if numeric_value1 is not None and numeric_value2 is not None:
-                # Compare numeric values
-                if numeric_value1 != numeric_value2:
-                    mismatches.append({
-                        'Reference #': ref1,
-                        'Title': title,
-                        'Field': field,
-                        f'{file1_name}': value1,
-                        f'{file2_name}': value2
-                    })
-            else:
-                # Compare as strings if not numeric
-                if value1 != value2:
-                    mismatches.append({
-                        'Reference #': ref2,
-                        'Title': title,
-                        'Field': field,
-                        f'{file1_name}': value1,
-                        f'{file2_name}': value2
-                    })
-                
-    return pd.DataFrame(mismatches)
\ No newline at end of file
+def encode_values(raw_values, normalizer=DEFAULT_NORMALIZER):
+    """
+    Dictionary-encode raw cell values into normalized-value codes.
+
+    Feeds repeat the same values over and over, so the normalizer (see
+    data/normalization.Normalizer) runs once per distinct raw value instead of
+    once per cell, and remembers its results across calls. Returns (codes,
+    values, numbers): codes index into values (the distinct normalized strings)
+    and numbers (what numeric comparison uses for each: the float value, or in
+    decimal mode an id shared by equal decimals; NaN when not numeric). Equal
+    normalized strings always share a code.
+    """
+    raw_codes, raw_uniques = pd.factorize(np.array(raw_values, dtype=object), use_na_sentinel=False)
+    # factorize reports None (an empty element) as NaN
+    normalize = normalizer.normalize
+    pairs = [normalize(value if isinstance(value, str) else None) for value in raw_uniques]
+    normalized = np.empty(len(pairs), dtype=object)
+    normalized[:] = [value for value, _ in pairs]
+    normalized_codes, values = pd.factorize(normalized, use_na_sentinel=False)
+
+    # Numeric key of each distinct normalized value (it only depends on the normalized text)
+    keys = np.empty(len(values), dtype=object)
+    keys[normalized_codes] = [number for _, number in pairs]
+    if normalizer.numeric == 'decimal':
+        # Canonical decimal strings -> ids, so equal decimals compare equal as floats
+        key_codes, _ = pd.factorize(keys, use_na_sentinel=True)
+        numbers = np.where(key_codes < 0, np.nan, key_codes).astype('float64')
+    else:
+        numbers = np.where(keys == None, np.nan, keys).astype('float64')  # noqa: E711
+
+    return normalized_codes[raw_codes], np.asarray(values, dtype=object), numbers
+
+# Matched property pairs compared per batch, bounding the size of the value grids
+MATCH_BATCH_SIZE = 50000
+
+def _fields_present(fields, titles):
+    if isinstance(fields, PropertyStore):
+        return set(fields.tags_present(fields.rows_for(titles)))
+    present = set()
+    for title in titles:
+        present.update(fields.get(title, {}).keys())
+    return present
+
+def _value_grid(fields, titles, tags, missing):
+    """titles x tags object array of field values from a PropertyStore or a plain dict of dicts"""
+    if isinstance(fields, PropertyStore):
+        return fields.grid(fields.rows_for(titles), tags, missing)
+    grid = np.empty((len(titles), len(tags)), dtype=object)
+    for row, title in enumerate(titles):
+        property = fields.get(title, {})
+        grid[row] = [property.get(tag, missing) for tag in tags]
+    return grid
+
+def compare_cells(raw1, raw2, normalizer=DEFAULT_NORMALIZER):
+    """Compare two aligned arrays of raw cell values.
+
+    Values that are numeric on both sides are compared as numbers (as the
+    normalizer decides), everything else as normalized strings. Returns the
+    positions of the mismatching cells, whether each of them was compared
+    as numbers, and the normalized values of both sides at those positions.
+    """
+    # Encode both sides together so equal values get equal codes across feeds
+    codes, values, numbers = encode_values(np.concatenate([raw1, raw2]), normalizer)
+    codes1, codes2 = codes[:len(raw1)], codes[len(raw1):]
+    numeric1, numeric2 = numbers[codes1], numbers[codes2]
+
+    both_numeric = ~np.isnan(numeric1) & ~np.isnan(numeric2)
+    mismatched = np.where(both_numeric, normalizer.numbers_differ(numeric1, numeric2), codes1 != codes2)
+    positions = np.flatnonzero(mismatched)
+    return positions, both_numeric[positions], values[codes1[positions]], values[codes2[positions]]
+
+def _used_codes(codes, size):
+    """Sorted distinct codes (each below size) of a code array, without sorting it"""
+    used = np.zeros(size, dtype=bool)
+    used[codes] = True
+    return np.flatnonzero(used)
+
+def _recode(codes, used, new_codes, size):
+    lookup = np.empty(size, dtype=np.int64)
+    lookup[used] = new_codes
+    return lookup[codes]
+
+def compare_codes(codes1, values1, codes2, values2, normalizer=DEFAULT_NORMALIZER):
+    """compare_cells for cells given as codes into each side's own array of raw
+    values (see PropertyStore.coded_grid), so nothing is done per cell but
+    integer array operations.
+
+    The raw values in use on either side are numbered together, and cells
+    whose raw text is identical in both feeds are dropped before anything is
+    normalized, as in data/feed_store.py: they can't mismatch. Only the
+    distinct values of the remaining cells go through encode_values.
+    """
+    used1 = _used_codes(codes1, len(values1))
+    used2 = _used_codes(codes2, len(values2))
+    raw = np.concatenate([values1[used1], values2[used2]])
+    raw_codes, raw_uniques = pd.factorize(raw, use_na_sentinel=False)
+    ids1 = _recode(codes1, used1, raw_codes[:len(used1)], len(values1))
+    ids2 = _recode(codes2, used2, raw_codes[len(used1):], len(values2))
+
+    candidates = np.flatnonzero(ids1 != ids2)
+    ids1, ids2 = ids1[candidates], ids2[candidates]
+
+    # factorize reports None (an empty element) as NaN, so the uniques are taken from raw
+    distinct = np.empty(len(raw_uniques), dtype=object)
+    distinct[raw_codes] = raw
+    needed = _used_codes(np.concatenate([ids1, ids2]), len(distinct))
+    needed_codes, values, numbers = encode_values(distinct[needed], normalizer)
+    normalized1 = _recode(ids1, needed, needed_codes, len(distinct))
+    normalized2 = _recode(ids2, needed, needed_codes, len(distinct))
+    numeric1, numeric2 = numbers[normalized1], numbers[normalized2]
+
+    both_numeric = ~np.isnan(numeric1) & ~np.isnan(numeric2)
+    mismatched = np.where(both_numeric, normalizer.numbers_differ(numeric1, numeric2), normalized1 != normalized2)
+    positions = np.flatnonzero(mismatched)
+    return (candidates[positions], both_numeric[positions],
+            values[normalized1[positions]], values[normalized2[positions]])
+
+def _compare_stores(store1, rows1, store2, rows2, all_fields, normalizer):
+    """compare_codes of the aligned rows x all_fields grids of two PropertyStores, flattened property-major"""
+    codes1, values1 = store1.coded_grid(rows1, all_fields, NOT_PRESENT)
+    codes2, values2 = store2.coded_grid(rows2, all_fields, NOT_PRESENT)
+    return compare_codes(codes1.ravel(), values1, codes2.ravel(), values2, normalizer)
+
+def _mismatch_frame(titles, all_fields, cells, refs1, refs2, file1_name, file2_name, keys=None):
+    """Result frame of the mismatching cells (compare_cells or compare_codes) of
+    two aligned property x field grids. keys, when given, adds a Key column
+    with each property's match key."""
+    field_count = len(all_fields)
+    positions, both_numeric, values1, values2 = cells
+
+    # Flat position -> (property, field) in the property-major layout
+    property_positions = positions // field_count if field_count else positions
+    field_positions = positions % field_count if field_count else positions
+
+    references = np.where(both_numeric, refs1[property_positions], refs2[property_positions])
+
+    columns = {'Reference #': references}
+    if keys is not None:
+        columns['Key'] = np.asarray(keys, dtype=object)[property_positions]
+    columns.update({
+        'Title': np.asarray(titles, dtype=object)[property_positions],
+        'Field': np.array(all_fields, dtype=object)[field_positions],
+        f'{file1_name}': values1,
+        f'{file2_name}': values2
+    })
+    return pd.DataFrame(columns)
+
+def compare_field_values(fields1, fields2, common_titles, file1_name, file2_name, normalizer=DEFAULT_NORMALIZER):
+    """
+    Compare every field of every common title between two property maps.
+
+    Both feeds are laid out as an aligned title x field grid and compared as
+    whole NumPy arrays: PropertyStores on their value codes (see
+    compare_codes), plain dicts after encoding the grids together (see
+    encode_values). Values that
+    are numeric in both feeds are compared as numbers, everything else as
+    normalized strings; normalizer decides how (see data/normalization).
+    """
+    titles = sorted(common_titles)
+
+    # Every field seen on any common property; a field neither side has compares equal
+    all_fields = sorted(_fields_present(fields1, titles) | _fields_present(fields2, titles))
+
+    if isinstance(fields1, PropertyStore) and isinstance(fields2, PropertyStore):
+        cells = _compare_stores(fields1, fields1.rows_for(titles), fields2, fields2.rows_for(titles), all_fields, normalizer)
+    else:
+        cells = compare_cells(_value_grid(fields1, titles, all_fields, NOT_PRESENT).ravel(),
+                              _value_grid(fields2, titles, all_fields, NOT_PRESENT).ravel(), normalizer)
+
+    return _mismatch_frame(
+        titles, all_fields, cells,
+        _value_grid(fields1, titles, ['Property_Reference'], NOT_PRESENT)[:, 0],
+        _value_grid(fields2, titles, ['Property_Reference'], NOT_PRESENT)[:, 0],
+        file1_name, file2_name
+    )
+
+def compare_matched_values(store1, store2, match, file1_name, file2_name, batch_size=MATCH_BATCH_SIZE,
+                           normalizer=DEFAULT_NORMALIZER):
+    """
+    compare_field_values for the property pairs of a key match (see
+    data/property_matcher.match_properties), streamed through in batches of
+    batch_size pairs so the value grids stay small on very large feeds.
+
+    When the properties were matched on something other than Title, a Key
+    column holds each pair's match key and Title the property's title.
+    """
+    rows1, rows2, keys = match['rows1'], match['rows2'], match['keys']
+    if match['key_fields'] == ('Title',):
+        keys = None
+
+    frames = []
+    for start in range(0, len(rows1), batch_size) or [0]:
+        batch1 = rows1[start:start + batch_size]
+        batch2 = rows2[start:start + batch_size]
+        all_fields = sorted(set(store1.tags_present(batch1)) | set(store2.tags_present(batch2)))
+
+        titles1 = store1.grid(batch1, ['Title'], None)[:, 0]
+        titles2 = store2.grid(batch2, ['Title'], '')[:, 0]
+        frames.append(_mismatch_frame(
+            np.where(titles1 == None, titles2, titles1), all_fields,  # noqa: E711
+            _compare_stores(store1, batch1, store2, batch2, all_fields, normalizer),
+            store1.grid(batch1, ['Property_Reference'], NOT_PRESENT)[:, 0],
+            store2.grid(batch2, ['Property_Reference'], NOT_PRESENT)[:, 0],
+            file1_name, file2_name,
+            None if keys is None else keys[start:start + batch_size]
+        ))
+
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
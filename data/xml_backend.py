@@ -0,0 +1,110 @@
+import io
+import os
+import importlib.util
+import xml.etree.ElementTree as ET
+
+# lxml is optional, the stdlib backend covers everything. It is only imported
+# once an LxmlBackend is created, i.e. when the first feed is parsed with it.
+_lxml_available = importlib.util.find_spec('lxml') is not None
+
+# Names accepted by set_backend() / --parser / the UI selector
+BACKEND_CHOICES = ['auto', 'lxml', 'stdlib']
+
+class StdlibBackend:
+    """xml.etree.ElementTree, always available
+
+    iter_elements(source, tag) streams every finished element with that tag
+    (every element when tag is None) and frees it once the caller moves on.
+    """
+    name = 'stdlib'
+    ParseError = ET.ParseError
+
+    def iter_elements(self, source, tag=None):
+        # Track open elements so a finished one can be detached from its parent
+        stack = []
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(element)
+                continue
+
+            stack.pop()
+            if tag is None or element.tag == tag:
+                yield element
+                element.clear()
+                if stack:
+                    stack[-1].remove(element)
+
+class LxmlBackend:
+    """lxml.etree: C-level iterparse and tag filtering"""
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self.etree = etree
+        self.ParseError = etree.XMLSyntaxError
+
+    def iter_elements(self, source, tag=None):
+        options = {}
+        if isinstance(source, io.StringIO):
+            # lxml only reads bytes from file objects
+            source = io.BytesIO(source.getvalue().encode('utf-8'))
+            options['encoding'] = 'utf-8'
+
+        for _, element in self.etree.iterparse(source, events=('end',), tag=tag, huge_tree=True,
+                                              remove_comments=True, remove_pis=True, **options):
+            yield element
+            element.clear(keep_tail=True)
+            # Drop the already processed siblings still referenced by the parent
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+def lxml_available():
+    return _lxml_available
+
+def available_backends():
+    """Backend names that can be selected in this environment"""
+    if lxml_available():
+        return list(BACKEND_CHOICES)
+    return ['auto', 'stdlib']
+
+def resolve_backend_name(name='auto'):
+    """'lxml' or 'stdlib' for a backend choice, checking that it can be used here"""
+    if name == 'auto':
+        return 'lxml' if lxml_available() else 'stdlib'
+    if name == 'lxml' and not lxml_available():
+        raise ValueError("The lxml parser backend was requested but lxml is not installed")
+    if name not in BACKEND_CHOICES:
+        raise ValueError(f"Unknown parser backend: {name}")
+    return name
+
+def create_backend(name='auto'):
+    if resolve_backend_name(name) == 'lxml':
+        return LxmlBackend()
+    return StdlibBackend()
+
+# Created on first use, so importing this module (or selecting a backend)
+# doesn't load a parser until a feed is actually parsed. Backends keep no
+# state between parses, so one instance per name is shared by every caller.
+_backends = {}
+_backend_name = os.environ.get('XML_CHECKER_PARSER', 'auto')
+
+def get_backend(name=None):
+    """The parser backend for a choice ('auto', 'lxml' or 'stdlib'), or the
+    process default (see set_backend) when name is None"""
+    resolved = resolve_backend_name(_backend_name if name is None else name)
+    backend = _backends.get(resolved)
+    if backend is None:
+        backend = _backends[resolved] = create_backend(resolved)
+    return backend
+
+def default_backend_name():
+    """The process default backend choice: XML_CHECKER_PARSER or the last set_backend()"""
+    return _backend_name
+
+def set_backend(name):
+    """Select the default parser backend of the whole process, for the CLI and
+    pool workers. Code serving several users (the web UI) passes its backend
+    to the parsing functions instead."""
+    global _backend_name
+    resolve_backend_name(name)
+    _backend_name = name
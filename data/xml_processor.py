@@ -1,13 +1,22 @@
-from data.field_comparator import extract_all_fields, compare_fields, compare_field_structure, compare_field_structure_reverse
-from data.value_comparator import compare_field_values
+from data.parsed_feed import as_feed
+from data.field_comparator import compare_feeds, compare_field_structure, compare_field_structure_reverse
+from data.value_comparator import compare_matched_values
+from data.normalization import DEFAULT_NORMALIZER
+from data.property_matcher import DEFAULT_KEY, match_properties, match_summary
+from data.instrumentation import stage
 
-def process_xml_content(xml_content1, xml_content2, file1_name, file2_name, compare_values):
-    fields1 = extract_all_fields(xml_content1)
-    fields2 = extract_all_fields(xml_content2)
+def process_xml_content(xml_content1, xml_content2, file1_name, file2_name, compare_values, match_key=DEFAULT_KEY,
+                        normalizer=DEFAULT_NORMALIZER):
+    # Each input is parsed at most once; passing ParsedFeeds skips parsing entirely
+    with stage('parse reference'):
+        feed1 = as_feed(xml_content1)
+    with stage('parse compared'):
+        feed2 = as_feed(xml_content2)
     
     if compare_values == "Missing Fields":
         # Use first XML as reference structure
-        comparison_result = compare_field_structure(xml_content1, xml_content2)
+        with stage('compare structure'):
+            comparison_result = compare_field_structure(feed1, feed2)
         return {
             'reference_fields': comparison_result['reference_fields'],
             'missing_fields': comparison_result['missing_in_second_file'],
@@ -17,7 +26,8 @@ def process_xml_content(xml_content1, xml_content2, file1_name, file2_name, comp
     
     elif compare_values == "Missing Fields (Reverse)":
         # Use second XML as reference structure (reverse check)
-        comparison_result = compare_field_structure_reverse(xml_content1, xml_content2)
+        with stage('compare structure'):
+            comparison_result = compare_field_structure_reverse(feed1, feed2)
         return {
             'reference_fields': comparison_result['reference_fields'],
             'missing_fields': comparison_result['missing_in_first_file'],
@@ -26,11 +36,17 @@ def process_xml_content(xml_content1, xml_content2, file1_name, file2_name, comp
         }
     
     elif compare_values == "Field Values":
-        _, _, common_titles = compare_fields(fields1, fields2)
-        field_value_mismatches_df = compare_field_values(fields1, fields2, common_titles, file1_name, file2_name)
+        # Properties are paired on match_key (e.g. "Property_Reference" or
+        # "Project+Unit_Number"); duplicate keys are reported, not compared
+        with stage('match properties'):
+            match = match_properties(feed1, feed2, match_key)
+        with stage('compare values'):
+            field_value_mismatches_df = compare_matched_values(feed1.properties, feed2.properties, match, file1_name, file2_name,
+                                                               normalizer=normalizer)
         return {
             'field_value_mismatches': field_value_mismatches_df,
-            'common_titles': compare_fields(fields1, fields2)
+            'common_titles': compare_feeds(feed1, feed2),
+            'match': match_summary(match)
         }
     
     else:
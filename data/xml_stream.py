@@ -0,0 +1,182 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import mmap
+import zlib
+import zipfile
+import contextlib
+from data.xml_backend import get_backend
+
+# File names accepted as feeds by the CLI, and upload types for the web UI
+FEED_SUFFIXES = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz', '.zip')
+UPLOAD_TYPES = ['xml', 'gz', 'bz2', 'xz', 'zip']
+
+# What opening or decompressing a broken upload raises, besides the parser's
+# ParseError: an empty file or a zip without exactly one feed (ValueError), a
+# truncated or corrupt gzip/bz2 stream (OSError, EOFError, zlib.error), a
+# corrupt xz stream or zip archive
+FEED_READ_ERRORS = (ValueError, OSError, EOFError, zlib.error, lzma.LZMAError, zipfile.BadZipFile)
+
+# Compression is detected from the content, not the file name
+_MAGIC_NUMBERS = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'PK\x03\x04', 'zip')
+]
+
+class BufferReader(io.RawIOBase):
+    """Read-only file object over any buffer (memoryview, bytearray, mmap)
+    that hands the parser one chunk at a time instead of copying it whole"""
+
+    def __init__(self, buffer):
+        # An mmap is sliced directly: a memoryview of it would keep the mapping
+        # from being closed for as long as the reader is alive
+        self._view = buffer if isinstance(buffer, mmap.mmap) else memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        chunk = self._view[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    # Seekable so zipfile can read the archive's central directory
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+def detect_compression(head):
+    """'gzip', 'bz2', 'xz', 'zip' or None (plain XML) from a feed's first bytes"""
+    head = bytes(head)
+    for magic, compression in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+def archive_members(source):
+    """Names of the XML feeds in a zip archive (a path or seekable binary file object)"""
+    with zipfile.ZipFile(source) as archive:
+        return [info.filename for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith('.xml')
+                and not os.path.basename(info.filename).startswith('.')]
+
+def decompressed(stream, head, member=None):
+    """Wrap a binary file object so it reads decompressed XML.
+
+    head is the stream's first bytes. gzip, bz2 and xz are decompressed
+    incrementally as the parser reads, never as a whole document. For a zip
+    archive member picks the feed to read; it may be left out when the archive
+    holds exactly one XML file.
+    """
+    compression = detect_compression(head)
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(stream, mode='rb')
+    if compression == 'xz':
+        return lzma.LZMAFile(stream, mode='rb')
+    if compression == 'zip':
+        if member is None:
+            members = archive_members(stream)
+            if len(members) != 1:
+                raise ValueError(f"The zip archive holds {len(members)} XML feeds, expected exactly one")
+            member = members[0]
+        return zipfile.ZipFile(stream).open(member)
+    return stream
+
+def content_stream(xml_content, member=None):
+    """Wrap in-memory XML content in a file object for iterparse.
+
+    bytes are wrapped without copying and the parser detects the encoding from
+    the XML declaration or BOM. Other buffers (memoryview, mmap) go through
+    BufferReader; str is still accepted for already decoded content.
+    Compressed content is decompressed on the fly (see decompressed), member
+    naming the feed to read from a zip archive.
+    """
+    if isinstance(xml_content, str):
+        return io.StringIO(xml_content)
+    if isinstance(xml_content, bytes):
+        stream = io.BytesIO(xml_content)
+    else:
+        stream = io.BufferedReader(BufferReader(xml_content))
+    return decompressed(stream, xml_content[:6], member)
+
+@contextlib.contextmanager
+def open_feed(path, member=None):
+    """Open a feed file for streaming, decompressing it on the fly if needed"""
+    with open(path, 'rb') as file:
+        stream = decompressed(file, file.peek(6)[:6], member)
+        with contextlib.closing(stream):
+            yield stream
+
+def is_feed_file(file_name):
+    return file_name.lower().endswith(FEED_SUFFIXES)
+
+def expand_archives(feeds):
+    """Replace every zip archive in a list of (name, content) feeds by one
+    (name/member, content, member) entry per XML file it holds; other feeds
+    become (name, content, None). content is raw bytes or a path."""
+    expanded = []
+    for name, content in feeds:
+        if isinstance(content, (str, os.PathLike)):
+            with open(content, 'rb') as file:
+                is_zip = detect_compression(file.read(6)) == 'zip'
+            members = archive_members(content) if is_zip else None
+        else:
+            is_zip = detect_compression(memoryview(content)[:6]) == 'zip'
+            members = archive_members(io.BytesIO(content)) if is_zip else None
+
+        if members is None:
+            expanded.append((name, content, None))
+        else:
+            expanded.extend((f'{name}/{member}', content, member) for member in members)
+    return expanded
+
+@contextlib.contextmanager
+def mapped_file(path):
+    """Memory-map a feed read-only. The mapping can be hashed directly and
+    parsed through content_stream (which also decompresses it); pages come
+    from the OS page cache instead of Python copies of the file."""
+    with open(path, 'rb') as file:
+        if not os.fstat(file.fileno()).st_size:
+            raise ValueError(f"{os.path.basename(path)} is empty")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            yield mapping
+
+def iter_properties(source, tag='property', backend=None):
+    """Stream <property> elements from a file path or file object one at a time.
+    A compressed file path is decompressed on the fly; file objects are read as
+    they are (content_stream and open_feed already decompress).
+
+    Each element is complete when it is yielded. Once the consumer asks for the
+    next one it is cleared and detached from its parent, so memory stays flat no
+    matter how many properties the feed holds. Don't keep references to yielded
+    elements (or their children) across iterations.
+
+    Parsing goes through backend (see data/xml_backend.py), the process
+    default when it is None.
+    """
+    backend = backend or get_backend()
+    if isinstance(source, (str, os.PathLike)):
+        return _iter_file_properties(source, tag, backend)
+    return backend.iter_elements(source, tag)
+
+def _iter_file_properties(path, tag, backend):
+    with open_feed(path) as stream:
+        yield from backend.iter_elements(stream, tag)
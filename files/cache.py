@@ -0,0 +1,167 @@
+import os
+import time
+import zlib
+import pickle
+import hashlib
+import tempfile
+
+# Bump whenever the layout of cached objects (ParsedFeed, result dicts) changes
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'XML_CHECKER_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'xml-checker')
+)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get('XML_CHECKER_CACHE_MAX_MB', '1024')) * 1024 * 1024
+
+_CHUNK_SIZE = 1024 * 1024
+
+def content_digest(data):
+    """Fast digest of raw feed bytes (any buffer: bytes, memoryview, mmap)"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def file_digest(source):
+    """content_digest of a file, read in chunks. source is a path or binary file object."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            for chunk in iter(lambda: file.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    else:
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def evict_files(directory, suffix, max_bytes=None, max_count=None, max_age=None, keep=()):
+    """Remove files ending in suffix from directory, least recently used first
+    (by mtime, which readers touch), until at most max_bytes and max_count of
+    them are left. Files unused for more than max_age seconds are removed
+    either way. Paths in keep are never removed. Returns the removed paths."""
+    entries = []
+    total = 0
+    try:
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(suffix):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    except FileNotFoundError:
+        return []
+
+    cutoff = None if max_age is None else time.time() - max_age
+    count = len(entries)
+    removed = []
+    for mtime, size, path in sorted(entries):
+        if path in keep:
+            continue
+        if ((cutoff is None or mtime >= cutoff) and (max_bytes is None or total <= max_bytes)
+                and (max_count is None or count <= max_count)):
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        removed.append(path)
+        total -= size
+        count -= 1
+    return removed
+
+def make_key(*parts):
+    """Combine digests and options into one cache key"""
+    return hashlib.blake2b(repr((CACHE_VERSION,) + parts).encode('utf-8'), digest_size=16).hexdigest()
+
+class DiskCache:
+    """Size-capped, least-recently-used cache of pickled objects on local disk.
+
+    Entries are zlib-compressed pickles named after their key. Reads touch the
+    file's mtime, so eviction removes the entries that were used longest ago
+    once the directory grows past max_bytes. Writes go through a temporary file
+    and os.replace, so several processes can share one directory.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = DEFAULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl.z')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            return default
+        except Exception:
+            # Corrupt or incompatible entry, drop it and recompute
+            self._remove(path)
+            return default
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+        data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if len(data) > self.max_bytes:
+            return
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self._path(key))
+        except Exception:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _entries(self):
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.name.endswith('.pkl.z')]
+        except FileNotFoundError:
+            return []
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        evict_files(self.directory, '.pkl.z', max_bytes=self.max_bytes)
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_MISSING = object()
+
+_cache = None
+
+def get_cache():
+    """Process-wide DiskCache using the default directory and size cap"""
+    global _cache
+    if _cache is None:
+        _cache = DiskCache()
+    return _cache
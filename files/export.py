@@ -0,0 +1,135 @@
+import os
+
+# Rows converted per step by the CSV writer and per Arrow record batch / Parquet row group
+CSV_CHUNK_ROWS = 50000
+BATCH_ROWS = 64 * 1024
+
+# Export formats: (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file')
+}
+
+# Columns that repeat a few distinct values over many rows (one row per
+# mismatching field of each property); they are stored once per distinct
+# value in Parquet and Arrow exports
+DICTIONARY_COLUMNS = ('Title', 'Field', 'Key')
+
+def format_for_path(path, default='csv'):
+    """Export format chosen by a file's extension (.csv, .parquet/.pq, .arrow/.feather/.ipc)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension in ('.arrow', '.feather', '.ipc'):
+        return 'arrow'
+    if extension == '.csv':
+        return 'csv'
+    return default
+
+def export_file_name(base_name, export_format):
+    return base_name + EXPORT_FORMATS[export_format][0]
+
+def iter_csv_chunks(df, chunk_size=CSV_CHUNK_ROWS, encoding='utf-8', header=True):
+    """CSV of a frame as encoded chunks of chunk_size rows, header first, so
+    the whole table is never held as one string"""
+    if header:
+        yield df.iloc[:0].to_csv(index=False).encode(encoding)
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size].to_csv(index=False, header=False).encode(encoding)
+
+def write_csv(df, target, chunk_size=CSV_CHUNK_ROWS):
+    """Write a frame as CSV to a path or binary file object, chunk by chunk"""
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'wb') as file:
+            return write_csv(df, file, chunk_size)
+    for chunk in iter_csv_chunks(df, chunk_size):
+        target.write(chunk)
+
+def to_arrow_table(df, dictionary_columns=DICTIONARY_COLUMNS):
+    """Arrow table of a frame (without its index), with the given columns dictionary-encoded"""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for index, field in enumerate(table.schema):
+        # Columns with no values at all (e.g. an empty table) are text columns here
+        if pa.types.is_null(field.type):
+            table = table.set_column(index, pa.field(field.name, pa.string()), table.column(index).cast(pa.string()))
+
+    for name in dictionary_columns:
+        index = table.schema.get_field_index(name)
+        if index < 0:
+            continue
+        column_type = table.schema.field(index).type
+        # Only text columns: the CLI summary, for one, has a count column named after the Title field
+        if pa.types.is_string(column_type) or pa.types.is_large_string(column_type):
+            # One chunk, so the whole column shares a single dictionary
+            column = table.column(index).combine_chunks().dictionary_encode()
+            table = table.set_column(index, pa.field(name, column.type), column)
+    return table
+
+def write_parquet(df, target, dictionary_columns=DICTIONARY_COLUMNS):
+    """Write a frame as a zstd-compressed Parquet file (path or binary file object).
+    The Arrow schema is stored with it, so dictionary columns load back as categoricals."""
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow_table(df, dictionary_columns), target, row_group_size=BATCH_ROWS * 16, compression='zstd')
+
+def write_arrow(df, target, dictionary_columns=DICTIONARY_COLUMNS):
+    """Write a frame as a zstd-compressed Arrow IPC file (path or binary file object), in record batches"""
+    import pyarrow as pa
+
+    table = to_arrow_table(df, dictionary_columns)
+    options = pa.ipc.IpcWriteOptions(compression='zstd')
+    with pa.ipc.new_file(target, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=BATCH_ROWS)
+
+_WRITERS = {'csv': write_csv, 'parquet': write_parquet, 'arrow': write_arrow}
+
+def write_frame(df, target, export_format=None):
+    """Write a frame in the given format, or the one chosen by the target path's extension"""
+    if export_format is None:
+        export_format = format_for_path(target) if isinstance(target, (str, os.PathLike)) else 'csv'
+    _WRITERS[export_format](df, target)
+
+def write_frames(frames, target, export_format=None):
+    """write_frame for a table that arrives as an iterable of frames with the
+    same columns (e.g. the batches of an out-of-core comparison). Each frame
+    is written as it comes, so the whole table is never held at once. There
+    must be at least one frame; it may be empty.
+
+    Arrow IPC files can't change a column's dictionary between record
+    batches, so there the text columns are written as plain strings."""
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, 'wb') as file:
+            return write_frames(frames, file, export_format or format_for_path(target))
+    export_format = export_format or 'csv'
+    frames = iter(frames)
+    first = next(frames)
+
+    if export_format == 'csv':
+        write_csv(first, target)
+        for frame in frames:
+            for chunk in iter_csv_chunks(frame, header=False):
+                target.write(chunk)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if export_format == 'parquet':
+        table = to_arrow_table(first)
+        writer = pq.ParquetWriter(target, table.schema, compression='zstd')
+        write = writer.write_table
+        dictionary_columns = DICTIONARY_COLUMNS
+    else:
+        table = to_arrow_table(first, dictionary_columns=())
+        writer = pa.ipc.new_file(target, table.schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+        write = lambda table: writer.write_table(table, max_chunksize=BATCH_ROWS)
+        dictionary_columns = ()
+
+    with writer:
+        write(table)
+        for frame in frames:
+            if len(frame):
+                write(to_arrow_table(frame, dictionary_columns).cast(table.schema))
@@ -0,0 +1,33 @@
+import html
+
+# Rows turned into table markup per step
+CHUNK_SIZE = 2000
+
+def iter_html_report(df, file1_name, file2_name, chunk_size=CHUNK_SIZE):
+    """The field value mismatch report as an HTML table, yielded as strings of
+    chunk_size rows each, so the whole document is never built as one string"""
+    yield f"""
+    <h2 style="text-align:center;">XML Comparison Report</h2>
+    <p style="text-align:center;">Comparison between {html.escape(file1_name)} and {html.escape(file2_name)}</p>
+    <table border="1" style="border-collapse: collapse; width: 100%; text-align: left;">
+        <tr>
+            <th>Property Name</th>
+            <th>{html.escape(file1_name)}</th>
+            <th>{html.escape(file2_name)}</th>
+        </tr>
+        """
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        rows = zip(chunk['Title'].tolist(), chunk[file1_name].tolist(), chunk[file2_name].tolist())
+        yield "".join(
+            f"<tr><td>{html.escape(str(title))}</td><td>{html.escape(str(value1))}</td><td>{html.escape(str(value2))}</td></tr>"
+            for title, value1, value2 in rows
+        )
+    yield """
+    </table>
+    """
+
+def write_html_report(df, file1_name, file2_name, target, chunk_size=CHUNK_SIZE):
+    """Write the HTML report to a binary file object, chunk by chunk"""
+    for chunk in iter_html_report(df, file1_name, file2_name, chunk_size):
+        target.write(chunk.encode('utf-8'))
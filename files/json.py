@@ -1,5 +1,6 @@
 import json
 import streamlit as st
+from data.required_fields import compile_rules
 
 def load_required_fields(json_file):
     if json_file is None:
@@ -7,9 +8,8 @@ def load_required_fields(json_file):
     
     try:
         data = json.load(json_file)
-        # Convert the list to a dictionary
-        required_fields = {field: None for field in data['required_fields']}
-        return required_fields
+        # Compile the list into a rule set once for every file checked against it
+        return compile_rules(data['required_fields'])
     except Exception as e:
         st.error(f"Error loading JSON file: {e}")
         return None
\ No newline at end of file
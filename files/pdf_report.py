@@ -0,0 +1,138 @@
+import os
+import time
+import tempfile
+import threading
+
+# Rows pulled from the mismatch frame per step; progress is reported once per chunk
+CHUNK_SIZE = 2000
+
+# Reports nobody downloaded (e.g. the browser tab was closed) are deleted this
+# many seconds after they were last written, the next time a report is started
+REPORT_TTL = 3600
+_REPORT_PREFIX = 'xml-report-'
+
+def write_pdf_report(df, file1_name, file2_name, path, on_progress=None, chunk_size=CHUNK_SIZE):
+    """Write the field value mismatch report to a PDF file.
+
+    Rows are read from the frame in chunks of plain column lists rather than
+    with iterrows(), and finished pages are compressed as they are added.
+    ReportLab still keeps every compressed page in memory until save() writes
+    the file, so memory grows with the size of the report, only more slowly
+    than with uncompressed pages. on_progress(rows_done) is called after every
+    chunk.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    p = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    width, height = A4
+
+    # Title and headers
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(100, height - 50, f"XML Comparison Report: {file1_name} vs {file2_name}")
+
+    # Column headers
+    p.setFont("Helvetica-Bold", 10)
+    y = height - 100
+    p.drawString(100, y, "Title")
+    p.drawString(300, y, file1_name)
+    p.drawString(500, y, file2_name)
+    y -= 20
+
+    # Paginate rows. Each page's columns are written as three text objects,
+    # which is much cheaper than one drawString call per cell.
+    total_rows = len(df)
+    top = y
+    page = ([], [], [])
+    for start in range(0, total_rows, chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        rows = zip(chunk['Title'].tolist(), chunk[file1_name].tolist(), chunk[file2_name].tolist())
+        for title, value1, value2 in rows:
+            if y < 100:  # Start new page if space runs out
+                _draw_rows(p, top, page)
+                p.showPage()
+                page = ([], [], [])
+                top = y = height - 50
+
+            page[0].append(str(title))
+            page[1].append(str(value1))
+            page[2].append(str(value2))
+            y -= 20
+
+        if on_progress is not None:
+            on_progress(min(start + chunk_size, total_rows))
+
+    _draw_rows(p, top, page)
+    p.save()
+
+def _draw_rows(p, top, columns):
+    for x, lines in zip((100, 300, 500), columns):
+        text = p.beginText(x, top)
+        text.setFont("Helvetica", 10)
+        text.setLeading(20)
+        for line in lines:
+            text.textLine(line)
+        p.drawText(text)
+
+def sweep_reports(max_age=REPORT_TTL, directory=None):
+    """Delete report files older than max_age seconds from the temporary directory"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory or tempfile.gettempdir()):
+        if not (entry.name.startswith(_REPORT_PREFIX) and entry.name.endswith('.pdf')):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+class PdfReportJob:
+    """Builds a PDF report in a background thread, writing it to a temporary file.
+
+    The Streamlit script keeps running while the report is generated; it polls
+    progress and serves the file from `path` once `done` is set and `error`
+    is None. Call cleanup() once the file has been served. Reports of sessions
+    that never get that far are removed by sweep_reports() after REPORT_TTL,
+    which every new job runs first; `expired` tells a late session its file is gone.
+    """
+
+    def __init__(self, df, file1_name, file2_name):
+        sweep_reports()
+        fd, self.path = tempfile.mkstemp(prefix=_REPORT_PREFIX, suffix='.pdf')
+        os.close(fd)
+        self.total_rows = len(df)
+        self.rows_done = 0
+        self.done = False
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(df, file1_name, file2_name), daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def expired(self):
+        return self.done and not os.path.exists(self.path)
+
+    @property
+    def progress(self):
+        return self.rows_done / self.total_rows if self.total_rows else 1.0
+
+    def _run(self, df, file1_name, file2_name):
+        try:
+            write_pdf_report(df, file1_name, file2_name, self.path, self._on_progress)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def _on_progress(self, rows_done):
+        self.rows_done = rows_done
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,184 @@
+import os
+import time
+import zlib
+import pickle
+import tempfile
+from files.cache import file_digest
+
+# Bump whenever the layout of the saved watch state changes
+WATCH_STATE_VERSION = 1
+
+# A file modified this close to the scan may still change within the same
+# mtime tick without its size changing, so it is hashed again on the next scan
+_RACY_NANOSECONDS = 2 * 1000 * 1000 * 1000
+
+class FeedWatcher:
+    """Tracks the feeds of a directory between scans.
+
+    Each file is remembered by (mtime, size, content digest). A scan only
+    stats the directory; a file is hashed when its mtime or size changed and
+    reported as modified only when its content did, so touching or copying a
+    feed over itself doesn't trigger a re-check. The last results of every
+    file are kept with its state, optionally saved to state_path so a restart
+    (or the next cron run) picks up where the previous one stopped.
+    """
+
+    def __init__(self, directory, is_feed, rules_key=None, state_path=None):
+        self.directory = directory
+        self.is_feed = is_feed
+        self.rules_key = rules_key
+        self.state_path = state_path
+        # file name -> (mtime_ns, size, digest), and file name -> list of results
+        self.files = {}
+        self.results = {}
+        # Whether files or results changed since the state was last saved
+        self.dirty = False
+        if state_path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, 'rb') as file:
+                state = pickle.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            return
+        except Exception:
+            # Unreadable state, start over as if it wasn't there
+            return
+        # State recorded for other rules (or another layout) says nothing about these
+        if state.get('version') != WATCH_STATE_VERSION or state.get('rules_key') != self.rules_key:
+            return
+        self.files = state['files']
+        self.results = state['results']
+
+    def save(self):
+        """Write the state to state_path, if anything changed since it was last written"""
+        if not self.state_path or not self.dirty:
+            return
+        directory = os.path.dirname(self.state_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        state = {
+            'version': WATCH_STATE_VERSION,
+            'rules_key': self.rules_key,
+            'files': self.files,
+            'results': self.results
+        }
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(temp_path, self.state_path)
+        self.dirty = False
+
+    def reset(self, rules_key):
+        """Forget every file, e.g. after the required fields changed"""
+        self.rules_key = rules_key
+        self.files = {}
+        self.results = {}
+        self.dirty = True
+
+    def scan(self):
+        """Compare the directory with the known files.
+
+        Returns (new, modified, removed) sorted lists of file names. Their
+        states are not recorded until update() or forget() is called, so a
+        file whose check failed to finish is reported again next time.
+        """
+        now = time.time_ns()
+        seen = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not self.is_feed(entry.name):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                seen[entry.name] = (stat.st_mtime_ns, stat.st_size)
+
+        new = []
+        modified = []
+        self._pending = {}
+        for name, (mtime, size) in seen.items():
+            known = self.files.get(name)
+            if known is not None and known[:2] == (mtime, size):
+                continue
+            try:
+                digest = file_digest(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            # Recorded without its mtime while racy, so the next scan hashes it again
+            self._pending[name] = (mtime if now - mtime > _RACY_NANOSECONDS else None, size, digest)
+            if known is None:
+                new.append(name)
+            elif known[2] != digest:
+                modified.append(name)
+            else:
+                # Same content under a new mtime (or no longer racy): nothing to check, just remember it
+                state = self._pending.pop(name)
+                if state != known:
+                    self.files[name] = state
+                    self.dirty = True
+
+        removed = [name for name in self.files if name not in seen]
+        return sorted(new), sorted(modified), sorted(removed)
+
+    def update(self, name, results):
+        """Record the results of a checked file along with the state it was checked in"""
+        self.files[name] = self._pending.pop(name)
+        previous = self.results.get(name, [])
+        self.results[name] = results
+        self.dirty = True
+        return previous
+
+    def forget(self, name):
+        """Drop a removed file, returning its last results"""
+        self.files.pop(name, None)
+        self.dirty = True
+        return self.results.pop(name, [])
+
+    def all_results(self):
+        """Last results of every file, in file name order"""
+        return [result for name in sorted(self.results) for result in self.results[name]]
+
+def result_delta(previous, current):
+    """What changed between two check results of the same feed.
+
+    Returns a dict with the property count before and after and, per field,
+    (before, after) missing and invalid counts for the fields whose counts
+    changed. An error that appeared or went away is reported as well.
+    """
+    def changes(counts_name):
+        before = previous.get(counts_name, {})
+        after = current.get(counts_name, {})
+        return {field: (before.get(field), after.get(field))
+                for field in list(after) + [field for field in before if field not in after]
+                if before.get(field) != after.get(field)}
+
+    return {
+        'file': current['file'],
+        'total_properties': (previous['total_properties'], current['total_properties']),
+        'missing_fields_counts': changes('missing_fields_counts'),
+        'invalid_fields_counts': changes('invalid_fields_counts'),
+        'error': (previous.get('error'), current.get('error'))
+    }
+
+def delta_report(previous_results, results):
+    """Compare the previous and current results of one file (a zip archive has
+    one result per feed inside it). Returns (added, changed, removed): the new
+    results, result_delta of the feeds whose counts changed, and the removed
+    feed names."""
+    before = {result['file']: result for result in previous_results}
+    after = {result['file']: result for result in results}
+    added = [result for name, result in after.items() if name not in before]
+    removed = [name for name in before if name not in after]
+    changed = []
+    for name, result in after.items():
+        if name in before:
+            delta = result_delta(before[name], result)
+            if (delta['missing_fields_counts'] or delta['invalid_fields_counts']
+                    or delta['total_properties'][0] != delta['total_properties'][1]
+                    or delta['error'][0] != delta['error'][1]):
+                changed.append(delta)
+    return added, changed, removed
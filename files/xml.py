@@ -1,8 +1,12 @@
 import streamlit as st
+from data.instrumentation import stage
 
 def read_xml_content(xml_file):
+    """Return the raw bytes of an uploaded XML file. They are not decoded here:
+    the parser detects the encoding from the XML declaration."""
     try:
-        return xml_file.read().decode("utf-8")
+        with stage(f'read {xml_file.name}'):
+            return xml_file.getvalue()
     except Exception as e:
         st.error(f"Error reading XML file {xml_file.name}: {e}")
         return None
\ No newline at end of file
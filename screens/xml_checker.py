@@ -1,15 +1,76 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import streamlit as st
 from files.json import load_required_fields
 from files.xml import read_xml_content
-from data.field_comparator import compare_fields, extract_all_fields
+from data.required_fields import check_feed_file
+from data.xml_stream import UPLOAD_TYPES, expand_archives
 from ui.display import display_results
+from data.instrumentation import stage
+from ui.backend import session_backend
+
+# One pool for the whole server, started on the first check and shared by every
+# session. Its workers are spawned rather than forked: forking the Streamlit
+# server would copy a multi-threaded process, locks held by other threads included.
+@st.cache_resource(show_spinner=False)
+def check_pool():
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context('spawn'))
+
+def check_uploads(uploads, required_fields):
+    """Check (name, bytes, member) uploads in the shared process pool, rendering a
+    live progress list and each file's results as soon as it finishes. Returns
+    the results in upload order.
+
+    Each upload is written to a temporary file once and workers are handed its
+    path, so a zip archive isn't pickled again for every feed it holds."""
+    progress = st.progress(0.0, text=f"Checked 0 of {len(uploads)} files")
+    status = [st.empty() for _ in uploads]
+    for placeholder, (file_name, _, _) in zip(status, uploads):
+        placeholder.markdown(f"⏳ **{file_name}** checking...")
+
+    results = [None] * len(uploads)
+    done = 0
+    parser = session_backend().name
+    with tempfile.TemporaryDirectory(prefix='xml_checker_') as upload_dir:
+        paths = {}
+        for xml_content in (xml_content for _, xml_content, _ in uploads):
+            if id(xml_content) not in paths:
+                paths[id(xml_content)] = path = os.path.join(upload_dir, str(len(paths)))
+                with open(path, 'wb') as upload_file:
+                    upload_file.write(xml_content)
+
+        executor = check_pool()
+        futures = {executor.submit(check_feed_file, paths[id(xml_content)], required_fields, member, parser): position
+                   for position, (_, xml_content, member) in enumerate(uploads)}
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); the next check starts a new pool
+                check_pool.clear()
+                result = {'total_properties': 0, 'missing_fields_counts': {}, 'error': "The checking process stopped unexpectedly"}
+            result = results[position] = {'file': uploads[position][0], **result}
+            if result.get('error'):
+                status[position].markdown(f"❌ **{result['file']}** failed")
+            else:
+                status[position].markdown(f"✅ **{result['file']}** {result['total_properties']} properties")
+            done += 1
+            progress.progress(done / len(uploads), text=f"Checked {done} of {len(uploads)} files")
+            display_results([result], True, [])
+
+    return results
 
 def render_page():
     # Sidebar for file upload
     st.sidebar.header("Upload Files")
 
     json_file = st.sidebar.file_uploader("Upload JSON file", type="json")
-    xml_files = st.sidebar.file_uploader("Upload XML files", type="xml", accept_multiple_files=True)
+    xml_files = st.sidebar.file_uploader("Upload XML files", type=UPLOAD_TYPES, accept_multiple_files=True,
+                                         help="Plain, gzip, bz2 or xz compressed XML, or zip archives of XML feeds")
 
     # Initialize session state for filter option if it doesn't exist
     if 'show_all_fields' not in st.session_state:
@@ -31,20 +92,32 @@ def render_page():
             if required_fields is None:
                 st.error("Failed to load required fields from JSON.")
             else:
-                results = []
+                uploads = []
                 for xml_file in xml_files:
                     xml_content = read_xml_content(xml_file)
                     if xml_content:
-                        fields = extract_all_fields(xml_content)
-                        file_results = compare_fields(fields, required_fields)
-                        results.append((xml_file.name, *file_results))
-                
+                        uploads.append((xml_file.name, xml_content))
+                # Every feed in a zip archive is checked as a file of its own
+                try:
+                    uploads = expand_archives(uploads)
+                except Exception as e:
+                    st.error(f"Error reading archive: {e}")
+                    uploads = []
+
+                # Files are checked concurrently and shown as they finish; the live
+                # view is replaced by the filterable results once all are done
+                live = st.empty()
+                with stage(f'check {len(uploads)} files'):
+                    with live.container():
+                        results = check_uploads(uploads, required_fields) if uploads else []
+                live.empty()
+
                 st.session_state.results = results
                 st.session_state.show_all_fields = "Show All"
 
                 # Get all column names for the dropdown
                 if results:
-                    all_columns = list(required_fields.keys())
+                    all_columns = list(required_fields.fields)
                     st.session_state.all_columns = all_columns
 
     # Display results and filter option only if results exist
@@ -54,7 +127,7 @@ def render_page():
         # Multi-select for choosing columns to show
         if 'all_columns' in st.session_state:
             st.session_state.columns_to_show = st.multiselect(
-                'Select Columns to Display',
+                'Select Fields to Display',
                 st.session_state.all_columns,
                 default=st.session_state.all_columns
             )
@@ -1,29 +1,72 @@
 import streamlit as st
 import pandas as pd
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+from data.parsed_feed import parse_feed
+from data.xml_stream import FEED_READ_ERRORS, UPLOAD_TYPES
 from data.xml_processor import process_xml_content
+from data.property_matcher import DEFAULT_KEY, key_label
+from data.normalization import DEFAULT_NORMALIZER, get_normalizer
+from data.instrumentation import stage
+from files.cache import content_digest, get_cache, make_key
+from files.pdf_report import PdfReportJob
+from files.html_report import write_html_report
+from ui.results_table import generate_html_table, render_mismatch_table
+from ui.downloads import download_export, download_frame
+from ui.normalization import normalization_options
+from ui.backend import session_backend
+
+def parse_upload(xml_bytes, backend=None):
+    # Parsed straight from the upload's bytes, no decoded str copy; compressed
+    # uploads are decompressed while parsing
+    with stage('parse'):
+        return parse_feed(xml_bytes, backend)
+
+# Parse each uploaded feed once; cache_resource hands back the same ParsedFeed
+# without copying it, so every comparison mode shares it. Keyed by the digest
+# of the upload (arguments starting with _ are not hashed by Streamlit), with
+# the disk cache behind it so a feed seen before a restart isn't parsed again.
+# Every backend builds the same ParsedFeed, so _backend isn't part of the key.
+@st.cache_resource(show_spinner=False, max_entries=8)
+def parse_feed_cached(digest, _xml_bytes, _backend=None):
+    return get_cache().get_or_compute(
+        make_key('feed', digest),
+        lambda: parse_upload(_xml_bytes, _backend)
+    )
 
 # Cache the expensive processing function
-@st.cache_data(show_spinner=False)
-def process_xml_content_cached(xml_content1, xml_content2, file1_name, file2_name, compare_values):
-    return process_xml_content(xml_content1, xml_content2, file1_name, file2_name, compare_values)
+@st.cache_data(show_spinner=False, max_entries=32)
+def process_xml_content_cached(digest1, digest2, _xml_bytes1, _xml_bytes2, file1_name, file2_name, compare_values, match_key,
+                               normalization, _backend=None):
+    def compute():
+        feed1 = parse_feed_cached(digest1, _xml_bytes1, _backend)
+        feed2 = parse_feed_cached(digest2, _xml_bytes2, _backend)
+        return process_xml_content(feed1, feed2, file1_name, file2_name, compare_values, match_key,
+                                   get_normalizer(*normalization))
+
+    return get_cache().get_or_compute(
+        make_key('comparison', digest1, digest2, file1_name, file2_name, compare_values, match_key, normalization),
+        compute
+    )
 
 def render_page():
     st.sidebar.header("Upload Files")
 
-    xml_file1 = st.sidebar.file_uploader("Upload Reference XML (correct structure)", type=["xml"], help="This will be used as the reference structure")
-    xml_file2 = st.sidebar.file_uploader("Upload XML to Compare", type=["xml"], help="This will be compared against the reference")
+    xml_file1 = st.sidebar.file_uploader("Upload Reference XML (correct structure)", type=UPLOAD_TYPES, help="This will be used as the reference structure")
+    xml_file2 = st.sidebar.file_uploader("Upload XML to Compare", type=UPLOAD_TYPES, help="This will be compared against the reference")
     
     # Add cache clear button
     if st.sidebar.button("🔄 Clear Cache", help="Clear cached results if you're experiencing issues"):
         st.cache_data.clear()
+        parse_feed_cached.clear()
+        get_cache().clear()
         st.sidebar.success("Cache cleared!")
 
     if xml_file1 and xml_file2:
-        xml_content1 = xml_file1.read().decode('utf-8')
-        xml_content2 = xml_file2.read().decode('utf-8')
+        with stage('read uploads'):
+            xml_bytes1 = xml_file1.getvalue()
+            xml_bytes2 = xml_file2.getvalue()
+        with stage('digest uploads'):
+            digest1 = content_digest(xml_bytes1)
+            digest2 = content_digest(xml_bytes2)
 
         file1_name = xml_file1.name
         file2_name = xml_file2.name
@@ -33,9 +76,35 @@ def render_page():
             options=["Missing Fields", "Missing Fields (Reverse)", "Field Values"]
         )
 
+        match_key = DEFAULT_KEY
+        normalization = DEFAULT_NORMALIZER.key()
+        if compare_values == "Field Values":
+            match_key = st.sidebar.text_input(
+                "Match properties on", value=DEFAULT_KEY,
+                help="Field identifying the same property in both files, e.g. Property_Reference, or several joined with + such as Project+Unit_Number"
+            ).strip() or DEFAULT_KEY
+            normalization = normalization_options('compare')
+
+        comparison_key = (digest1, digest2, compare_values, match_key, normalization)
+        # Exports are shared by every session; their headers carry the file names
+        export_key = comparison_key + (file1_name, file2_name)
         if st.sidebar.button("Start Comparison"):
+            st.session_state.comparison_key = comparison_key
+
+        # Results stay on screen across reruns, e.g. while a PDF report is generated
+        if st.session_state.get('comparison_key') == comparison_key:
             # Use cached function for performance
-            results = process_xml_content_cached(xml_content1, xml_content2, file1_name, file2_name, compare_values)
+            backend = session_backend()
+            try:
+                with stage(f'comparison: {compare_values}'):
+                    results = process_xml_content_cached(digest1, digest2, xml_bytes1, xml_bytes2, file1_name, file2_name, compare_values, match_key,
+                                                         normalization, backend)
+            except backend.ParseError as e:
+                st.error(f"Error parsing XML file: {str(e)}")
+                return
+            except FEED_READ_ERRORS as e:
+                st.error(f"Error reading XML file: {str(e)}")
+                return
             
             if compare_values == "Missing Fields":
                 st.subheader("Field Structure Comparison")
@@ -87,14 +156,10 @@ def render_page():
                     st.error(f"❌ {file2_name} is missing {results['total_missing']} out of {results['total_reference_fields']} fields from the reference.")
                     st.info("💡 Tip: To check for extra fields, reverse the file order (upload the current second file as the reference).")
 
-                # Offer CSV export
-                csv = comparison_df.to_csv(index=False)
-                st.download_button(
-                    "📥 Download Comparison Table (CSV)", 
-                    csv, 
-                    file_name=f"field_comparison_{file1_name}_vs_{file2_name}.csv", 
-                    mime="text/csv"
-                )
+                # Offer CSV / Parquet / Arrow export
+                download_frame(comparison_df, "📥 Download Comparison Table",
+                               f"field_comparison_{file1_name}_vs_{file2_name}", key='download_comparison',
+                               data_key=export_key)
             
             elif compare_values == "Missing Fields (Reverse)":
                 st.subheader("Field Structure Comparison (Reverse)")
@@ -145,126 +210,99 @@ def render_page():
                 else:
                     st.error(f"❌ {file1_name} is missing {results['total_missing']} out of {results['total_reference_fields']} fields from the reference.")
 
-                # Offer CSV export
-                csv = comparison_df.to_csv(index=False)
-                st.download_button(
-                    "📥 Download Comparison Table (CSV)", 
-                    csv, 
-                    file_name=f"field_comparison_reverse_{file2_name}_vs_{file1_name}.csv", 
-                    mime="text/csv"
-                )
+                # Offer CSV / Parquet / Arrow export
+                download_frame(comparison_df, "📥 Download Comparison Table",
+                               f"field_comparison_reverse_{file2_name}_vs_{file1_name}", key='download_comparison_reverse',
+                               data_key=export_key)
             
             elif compare_values == "Field Values":
                 unique_titles = results['field_value_mismatches']['Title'].unique()
                 
                 st.subheader("Compare Field Values")
+                render_match_summary(results['match'], file1_name, file2_name)
 
                 if not results['field_value_mismatches'].empty:
-                    # Highlight rows by title and display dataframe
-                    styled_df = highlight_rows_by_title(results['field_value_mismatches'])
                     st.write(f"{len(unique_titles)} Properties having field value mismatches between {len(results['field_value_mismatches'])} rows:")
-                    st.dataframe(styled_df)
+                    # Only the visible page is sliced, styled and sent to the browser
+                    with stage('render results page'):
+                        page_df = render_mismatch_table(results['field_value_mismatches'], key='mismatches_' + '_'.join(map(str, comparison_key)))
 
-                    # Offer CSV export for field value mismatches
-                    csv_mismatches = results['field_value_mismatches'].to_csv(index=False)
-                    st.download_button("Download CSV", csv_mismatches, file_name="field_value_mismatches.csv", mime="text/csv")
+                    # Offer CSV / Parquet / Arrow export for field value mismatches
+                    download_frame(results['field_value_mismatches'], "Download", "field_value_mismatches", key='download_mismatches',
+                                   data_key=export_key)
 
-                    # PDF generation with progress bar
+                    # PDF generation runs in a background worker so the page stays responsive
                     if st.button("Generate PDF Report"):
-                        progress = st.progress(0)  # Initialize the progress bar
-                        pdf_data = generate_pdf_report_with_progress(results['field_value_mismatches'], file1_name, file2_name, progress)
-                        st.download_button("Download PDF", data=pdf_data, file_name="field_value_mismatches.pdf", mime="application/pdf")
+                        start_pdf_report(comparison_key, results['field_value_mismatches'], file1_name, file2_name)
+                    render_pdf_report_status(comparison_key)
                         
-                    # Option to render the table as HTML
+                    # Every row as an HTML report, written chunk by chunk once it is asked for
+                    mismatches = results['field_value_mismatches']
+                    download_export("Full HTML Report",
+                                    lambda file: write_html_report(mismatches, file1_name, file2_name, file),
+                                    "field_value_mismatches.html", "text/html", 'download_html_report', export_key)
+
+                    # Option to render the current page as HTML inline
                     if st.button("Display Results in HTML"):
-                        html_table = generate_html_table(results['field_value_mismatches'], file1_name, file2_name)
+                        html_table = generate_html_table(page_df, file1_name, file2_name)
                         st.markdown(html_table, unsafe_allow_html=True)
-                        st.write("You can print this page and save it as PDF in your browser.")
+                        st.write("You can print this page or the downloaded report and save it as PDF in your browser.")
                 else:
                     st.write("No mismatches found between the field values.")
     else:
         st.info("Please upload a pair of XML files in the sidebar to get started.")
 
-def highlight_rows_by_title(df):
-    def style_func(row):
-        if row['Title'] in title_colors:
-            return [f'background-color: {title_colors[row["Title"]]}'] * len(row)
-        return [''] * len(row)
-    
-    title_colors = {}
-    unique_titles = df['Title'].unique()
-    colors = ['#f5f5f5', '#ffffff']
-    
-    for i, title in enumerate(unique_titles):
-        title_colors[title] = colors[i % len(colors)]
-    
-    return df.style.apply(style_func, axis=1)
-
-# Function to generate HTML table
-def generate_html_table(df, file1_name, file2_name):
-    html = [f"""
-    <h2 style="text-align:center;">XML Comparison Report</h2>
-    <p style="text-align:center;">Comparison between {file1_name} and {file2_name}</p>
-    <table border="1" style="border-collapse: collapse; width: 100%; text-align: left;">
-        <tr>
-            <th>Property Name</th>
-            <th>{file1_name}</th>
-            <th>{file2_name}</th>
-        </tr>
-    """]
-    
-    for _, row in df.iterrows():
-        html.append(f"""
-        <tr>
-            <td>{row['Title']}</td>
-            <td>{row['Value1']}</td>
-            <td>{row['Value2']}</td>
-        </tr>
-        """)
+def render_match_summary(match, file1_name, file2_name):
+    """Matched property counts and any duplicate or missing keys, which are left out of the value comparison"""
+    key = key_label(match['key_fields'])
+    st.caption(f"Properties matched on **{key}**")
+    for file_name, duplicates, unkeyed in ((file1_name, match['duplicates_in_first'], match['unkeyed_first']),
+                                           (file2_name, match['duplicates_in_second'], match['unkeyed_second'])):
+        if duplicates:
+            st.warning(f"{len(duplicates)} {key} values occur more than once in {file_name}; those properties are not compared.")
+            with st.expander(f"Duplicate keys in {file_name}"):
+                st.dataframe(pd.DataFrame({key: list(duplicates), 'Occurrences': list(duplicates.values())}),
+                             use_container_width=True, hide_index=True)
+        if unkeyed:
+            st.info(f"{unkeyed} properties in {file_name} have no {key} and are not compared.")
 
-    html.append("</table>")
-    return "".join(html)
+def start_pdf_report(comparison_key, df, file1_name, file2_name):
+    discard_pdf_report()
+    st.session_state.pdf_job = (comparison_key, PdfReportJob(df, file1_name, file2_name).start())
 
-# Function to generate PDF report with progress bar
-def generate_pdf_report_with_progress(df, file1_name, file2_name, progress):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+def discard_pdf_report():
+    # The download button already holds the report's bytes, so the file can go once it is clicked
+    pdf_job = st.session_state.pop('pdf_job', None)
+    if pdf_job is not None:
+        pdf_job[1].cleanup()
 
-    # Title and headers
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(100, height - 50, f"XML Comparison Report: {file1_name} vs {file2_name}")
-    
-    # Column headers
-    p.setFont("Helvetica-Bold", 10)
-    y = height - 100
-    p.drawString(100, y, "Title")
-    p.drawString(300, y, file1_name)
-    p.drawString(500, y, file2_name)
-    y -= 20
-
-    # Paginate rows with progress update
-    total_rows = len(df)
-    p.setFont("Helvetica", 10)
-    for index, row in df.iterrows():
-        if y < 100:  # Start new page if space runs out
-            p.showPage()
-            p.setFont("Helvetica", 10)
-            y = height - 50
+def render_pdf_report_status(comparison_key):
+    pdf_job = st.session_state.get('pdf_job')
+    if pdf_job is None or pdf_job[0] != comparison_key:
+        return
 
-        # Write row data
-        p.drawString(100, y, str(row['Title']))
-        p.drawString(300, y, str(row['Value1']))
-        p.drawString(500, y, str(row['Value2']))
-        y -= 20
-
-        # Update progress bar
-        progress.progress((index + 1) / total_rows)
+    job = pdf_job[1]
+    if not job.done:
+        pdf_report_progress()
+    elif job.error is not None:
+        st.error(f"PDF generation failed: {job.error}")
+    elif job.expired:
+        st.info("The PDF report was not downloaded in time and has been removed; generate it again.")
+    else:
+        with open(job.path, 'rb') as pdf_file:
+            st.download_button("Download PDF", data=pdf_file, file_name="field_value_mismatches.pdf", mime="application/pdf",
+                               on_click=discard_pdf_report)
 
-    p.save()
+# Only this fragment reruns while the report is being built, about once a second
+@st.fragment(run_every=1)
+def pdf_report_progress():
+    pdf_job = st.session_state.get('pdf_job')
+    if pdf_job is None or pdf_job[1].done:
+        # Rerun the whole page to swap the progress bar for the download button
+        st.rerun()
 
-    buffer.seek(0)
-    return buffer.getvalue()
+    job = pdf_job[1]
+    st.progress(job.progress, text=f"Generating PDF report: {job.rows_done} of {job.total_rows} rows")
 
 if __name__ == "__main__":
     render_page()
\ No newline at end of file
@@ -1,7 +1,19 @@
 import streamlit as st
-import xml.etree.ElementTree as ET
-from collections import Counter
-import pandas as pd
+from data.xml_stream import FEED_READ_ERRORS, UPLOAD_TYPES, content_stream
+from data.field_index import build_field_index
+from data.instrumentation import stage
+from files.cache import content_digest, get_cache, make_key
+from ui.downloads import download_frame
+from ui.backend import session_backend
+
+# One index per uploaded file, built in a single pass and kept across reruns,
+# so picking another field is a dictionary lookup instead of a tree walk
+@st.cache_resource(show_spinner=False, max_entries=8)
+def load_field_index(digest, _xml_bytes, _backend=None):
+    def build():
+        with stage('build field index'):
+            return build_field_index(content_stream(_xml_bytes), _backend)
+    return get_cache().get_or_compute(make_key('field_index', digest), build)
 
 def render_page():
     st.title("XML Field Explorer")
@@ -9,76 +21,62 @@ def render_page():
     
     # Sidebar for file upload
     st.sidebar.header("Upload XML File")
-    xml_file = st.sidebar.file_uploader("Upload XML file", type="xml")
+    xml_file = st.sidebar.file_uploader("Upload XML file", type=UPLOAD_TYPES)
     
     if xml_file is not None:
-        # Read and parse XML content
-        xml_content = xml_file.read().decode('utf-8')
+        # Read and index XML content
+        with stage('read upload'):
+            xml_bytes = xml_file.getvalue()
+        with stage('digest upload'):
+            digest = content_digest(xml_bytes)
+        backend = session_backend()
         
         try:
-            root = ET.fromstring(xml_content)
+            field_index = load_field_index(digest, xml_bytes, backend)
             
             # Show available operations
             st.sidebar.header("Operations")
             operation = st.sidebar.selectbox("Select Operation", ["Get Field Values"])
             
             if operation == "Get Field Values":
-                # Extract all unique field names from the XML
-                all_fields = extract_all_field_names(root)
-                
-                if all_fields:
+                if field_index:
                     st.sidebar.header("Select Field")
-                    selected_field = st.sidebar.selectbox("Choose a field to analyze", sorted(all_fields))
+                    selected_field = st.sidebar.selectbox("Choose a field to analyze", sorted(field_index))
                     
+                    # The analysis stays on screen across reruns, e.g. while its download is prepared
                     if st.sidebar.button("Analyze Field"):
-                        analyze_field_values(root, selected_field)
+                        st.session_state.analyzed_field = (digest, selected_field)
+                    if st.session_state.get('analyzed_field') == (digest, selected_field):
+                        with stage(f'analyze {selected_field}'):
+                            analyze_field_values(field_index, selected_field, digest)
                 else:
                     st.error("No fields found in the XML file.")
                     
-        except ET.ParseError as e:
+        except backend.ParseError as e:
             st.error(f"Error parsing XML file: {str(e)}")
+        except FEED_READ_ERRORS as e:
+            st.error(f"Error reading XML file: {str(e)}")
     else:
         st.info("Please upload an XML file in the sidebar to get started.")
 
-def extract_all_field_names(root):
-    """Extract all unique field names from the XML structure"""
-    field_names = set()
-    
-    def traverse_element(element):
-        # Add current element tag
-        field_names.add(element.tag)
-        
-        # Recursively traverse all children
-        for child in element:
-            traverse_element(child)
-    
-    traverse_element(root)
-    return field_names
+def analyze_field_values(field_index, field_name, digest=None):
+    """Analyze values for a specific field in the XML. digest identifies the
+    uploaded file, for the download cache."""
+    # pandas is only loaded once a field is analyzed, not to show the page
+    import pandas as pd
 
-def analyze_field_values(root, field_name):
-    """Analyze values for a specific field in the XML"""
     st.subheader(f"Analysis for field: '{field_name}'")
     
-    # Find all elements with the specified field name
-    elements = root.findall(f".//{field_name}")
+    stats = field_index.get(field_name)
     
-    if not elements:
+    if stats is None or not stats.count:
         st.warning(f"No elements found with field name '{field_name}'")
         return
     
-    # Extract values
-    values = []
-    empty_count = 0
-    
-    for element in elements:
-        if element.text is not None and element.text.strip():
-            values.append(element.text.strip())
-        else:
-            empty_count += 1
-    
-    # Count occurrences of each value
-    value_counts = Counter(values)
-    total_elements = len(elements)
+    # Occurrences of each value, counted while indexing
+    value_counts = stats.values
+    total_elements = stats.count
+    empty_count = stats.empty_count
     
     # Display summary statistics
     col1, col2, col3, col4 = st.columns(4)
@@ -93,7 +91,7 @@ def analyze_field_values(root, field_name):
         st.metric("Empty/Null Values", empty_count)
     
     with col4:
-        st.metric("Non-Empty Values", len(values))
+        st.metric("Non-Empty Values", stats.non_empty_count)
     
     # Display value distribution
     if value_counts:
@@ -125,25 +123,19 @@ def analyze_field_values(root, field_name):
             st.bar_chart(chart_data)
         
         # Provide download option
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="Download Results as CSV",
-            data=csv,
-            file_name=f"{field_name}_analysis.csv",
-            mime="text/csv"
-        )
+        download_frame(df, "Download Results", f"{field_name}_analysis", key='download_field_analysis',
+                       data_key=(digest, field_name))
     
     # Show sample values if available
-    if values:
+    if stats.samples:
         st.subheader("Sample Values")
-        sample_size = min(10, len(values))
-        sample_values = values[:sample_size]
+        sample_size = len(stats.samples)
         
-        for i, value in enumerate(sample_values, 1):
+        for i, value in enumerate(stats.samples, 1):
             st.text(f"{i}. {value}")
         
-        if len(values) > sample_size:
-            st.info(f"Showing {sample_size} of {len(values)} non-empty values")
+        if stats.non_empty_count > sample_size:
+            st.info(f"Showing {sample_size} of {stats.non_empty_count} non-empty values")
 
 if __name__ == "__main__":
     render_page()
\ No newline at end of file
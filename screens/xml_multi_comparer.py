@@ -0,0 +1,127 @@
+import os
+import multiprocessing
+import streamlit as st
+import pandas as pd
+from data.multi_comparator import compare_many, mismatch_summary, presence_matrix
+from data.property_matcher import DEFAULT_KEY
+from data.normalization import get_normalizer
+from data.xml_stream import FEED_READ_ERRORS, UPLOAD_TYPES, expand_archives
+from data.instrumentation import stage
+from files.cache import content_digest, get_cache, make_key
+from screens.xml_comparer import parse_feed_cached
+from ui.downloads import download_frame
+from ui.normalization import normalization_options
+from ui.backend import session_backend
+
+# One entry per reference and set of candidates. The reference comes from the
+# same parse cache as the two-file comparer, so it is indexed once no matter
+# how many feeds are checked against it.
+@st.cache_data(show_spinner=False, max_entries=8)
+def compare_many_cached(reference_digest, candidate_digests, _reference_bytes, _candidates, reference_name, candidate_names, match_key, normalization,
+                        _backend=None):
+    # _candidates are (bytes, zip member or None) pairs
+    def compute():
+        reference = parse_feed_cached(reference_digest, _reference_bytes, _backend)
+        workers = min(len(_candidates), os.cpu_count() or 1)
+        # Spawned, not forked, like the checker's pool: forking the multi-threaded
+        # Streamlit server would copy locks held by its other threads
+        return list(compare_many(reference, _candidates, candidate_names, reference_name, workers, _backend.name, match_key,
+                                 get_normalizer(*normalization), multiprocessing.get_context('spawn')))
+
+    return get_cache().get_or_compute(
+        make_key('multi_comparison', reference_digest, candidate_digests, reference_name, candidate_names, match_key, normalization),
+        compute
+    )
+
+def render_page():
+    st.title("Compare Many XML Feeds")
+    st.markdown("Check any number of feeds against one reference feed")
+
+    st.sidebar.header("Upload Files")
+    reference_file = st.sidebar.file_uploader("Upload Reference XML (correct structure)", type=UPLOAD_TYPES, key='multi_reference',
+                                              help="Parsed once and shared by every comparison")
+    candidate_files = st.sidebar.file_uploader("Upload XMLs to Compare", type=UPLOAD_TYPES, accept_multiple_files=True,
+                                               key='multi_candidates')
+
+    if not reference_file or not candidate_files:
+        st.info("Please upload a reference XML and one or more XML files to compare in the sidebar to get started.")
+        return
+
+    with stage('read uploads'):
+        reference_bytes = reference_file.getvalue()
+        # Every feed in a zip archive is compared as a candidate of its own
+        try:
+            uploads = expand_archives([(candidate.name, candidate.getvalue()) for candidate in candidate_files])
+        except Exception as e:
+            st.error(f"Error reading archive: {e}")
+            return
+    with stage('digest uploads'):
+        reference_digest = content_digest(reference_bytes)
+        # An archive is digested once however many feeds it holds
+        digests = {}
+        for _, data, _ in uploads:
+            if id(data) not in digests:
+                digests[id(data)] = content_digest(data)
+        candidate_digests = tuple(digests[id(data)] for _, data, _ in uploads)
+    candidates = [(data, member) for _, data, member in uploads]
+    candidate_names = tuple(name for name, _, _ in uploads)
+
+    match_key = st.sidebar.text_input(
+        "Match properties on", value=DEFAULT_KEY, key='multi_match_key',
+        help="Field identifying the same property in every file, e.g. Property_Reference, or several joined with + such as Project+Unit_Number"
+    ).strip() or DEFAULT_KEY
+    normalization = normalization_options('multi')
+
+    comparison_key = (reference_digest, candidate_digests, candidate_names, match_key, normalization)
+    if st.sidebar.button("Start Comparison", key='multi_start'):
+        st.session_state.multi_comparison_key = comparison_key
+
+    if st.session_state.get('multi_comparison_key') != comparison_key:
+        return
+
+    backend = session_backend()
+    try:
+        with stage(f'compare {len(candidates)} feeds'):
+            with st.spinner(f"Comparing {len(candidates)} feeds against {reference_file.name}..."):
+                results = compare_many_cached(reference_digest, candidate_digests, reference_bytes, candidates,
+                                              reference_file.name, candidate_names, match_key, normalization, backend)
+    except backend.ParseError as e:
+        st.error(f"Error parsing reference XML: {str(e)}")
+        return
+    except FEED_READ_ERRORS as e:
+        st.error(f"Error reading reference XML: {str(e)}")
+        return
+    reference = parse_feed_cached(reference_digest, reference_bytes, backend)
+
+    st.info(f"Using **{reference_file.name}** as the **Reference XML**")
+    summary = mismatch_summary(results)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Feeds Compared", len(results))
+    with col2:
+        st.metric("Feeds Missing Fields", int((summary['Missing Fields'] > 0).sum()))
+    with col3:
+        st.metric("Feeds With Value Mismatches", int((summary['Value Mismatches'] > 0).sum()))
+
+    for result in results:
+        if 'error' in result:
+            st.error(f"Error parsing {result['file']}: {result['error']}")
+
+    st.subheader("Per-Feed Summary")
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    st.subheader("Field Presence")
+    matrix = presence_matrix(reference, results)
+    st.dataframe(matrix, use_container_width=True, height=min(600, (len(matrix) + 1) * 35))
+
+    st.subheader("Value Mismatches per Field")
+    by_field = pd.DataFrame({result['file']: result.get('mismatches_by_field', {}) for result in results})
+    if by_field.empty:
+        st.write("No mismatches found between the field values.")
+    else:
+        st.dataframe(by_field.fillna(0).astype(int).sort_index(), use_container_width=True)
+
+    download_frame(matrix.reset_index(), "📥 Download Field Presence", f"field_presence_{reference_file.name}",
+                   key='download_field_presence', data_key=comparison_key)
+    download_frame(summary, "📥 Download Per-Feed Summary", f"feed_summary_{reference_file.name}",
+                   key='download_feed_summary', data_key=comparison_key)
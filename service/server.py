@@ -0,0 +1,450 @@
+import io
+import os
+import json
+import shutil
+import signal
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from data.property_matcher import DEFAULT_KEY
+from data.normalization import build_normalizer
+from data.required_fields import compile_rules
+from data.xml_stream import archive_members, detect_compression
+from files.cache import evict_files
+from files.export import EXPORT_FORMATS, iter_csv_chunks, write_frame
+from service import tasks
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest request body (an uploaded feed or a JSON request), and how many
+# uploaded feeds are kept, in how much disk space and for how long
+DEFAULT_MAX_UPLOAD_MB = int(os.environ.get('XML_CHECKER_MAX_UPLOAD_MB', '1024'))
+DEFAULT_UPLOADS_MAX_MB = int(os.environ.get('XML_CHECKER_UPLOADS_MAX_MB', '4096'))
+DEFAULT_MAX_UPLOADS = 256
+DEFAULT_UPLOAD_TTL_HOURS = float(os.environ.get('XML_CHECKER_UPLOAD_TTL_HOURS', '24'))
+
+_UPLOAD_SUFFIX = '.feed'
+
+# Request bodies are read, hashed and spooled to disk this many bytes at a time
+_READ_SIZE = 1024 * 1024
+
+# Mismatch rows encoded per chunk of a streamed JSON response
+_JSON_CHUNK_ROWS = 5000
+
+class RequestError(Exception):
+    """A request the service can't serve, answered with status and a JSON error"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class FeedService:
+    """Comparison engine behind the HTTP endpoints.
+
+    Work runs in a process pool that is started (and warmed up) once, so a
+    request doesn't pay for process start-up or imports. Workers share the
+    persistent disk cache with the CLI and the web UI and keep the feeds they
+    parsed last in memory. Feeds are either uploaded once (POST /feeds, stored
+    under their content digest) or named by a path below feed_root.
+
+    Request bodies are limited to max_upload_mb. Uploaded feeds are kept like
+    the entries of files/cache.DiskCache: using one touches it, and the ones
+    used longest ago are removed once there are more than max_uploads of them
+    or they take more than uploads_max_mb, as are feeds unused for
+    upload_ttl_hours.
+    """
+
+    def __init__(self, feed_root, workers=1, parser='auto', cache_dir=None, max_upload_mb=None,
+                 uploads_max_mb=None, max_uploads=None, upload_ttl_hours=None):
+        self.feed_root = os.path.realpath(feed_root)
+        self.workers = workers
+        self.parser = parser
+        self.max_upload_bytes = (DEFAULT_MAX_UPLOAD_MB if max_upload_mb is None else max_upload_mb) * 1024 * 1024
+        self.uploads_max_bytes = (DEFAULT_UPLOADS_MAX_MB if uploads_max_mb is None else uploads_max_mb) * 1024 * 1024
+        self.max_uploads = DEFAULT_MAX_UPLOADS if max_uploads is None else max_uploads
+        self.upload_ttl = (DEFAULT_UPLOAD_TTL_HOURS if upload_ttl_hours is None else upload_ttl_hours) * 3600
+        self.upload_dir = tempfile.mkdtemp(prefix='xml-checker-feeds-')
+        # Feed id -> the name it was uploaded under
+        self.upload_names = {}
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=tasks.init_worker,
+                                            initargs=(parser, cache_dir))
+        # Start every worker now rather than on the first requests
+        for future in [self.executor.submit(tasks.ping) for _ in range(workers)]:
+            future.result()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        shutil.rmtree(self.upload_dir, ignore_errors=True)
+
+    def run(self, name, *args):
+        """Run a task in the pool and wait for its result"""
+        try:
+            return self.executor.submit(tasks.run_task, name, *args).result()
+        except (ValueError, KeyError) as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, e.args[0] if e.args else str(e))
+
+    def _upload_path(self, feed_id):
+        return os.path.join(self.upload_dir, feed_id + _UPLOAD_SUFFIX)
+
+    def evict_uploads(self, keep=()):
+        """Remove the uploaded feeds past their time or over the limits, least recently used first"""
+        removed = evict_files(self.upload_dir, _UPLOAD_SUFFIX, self.uploads_max_bytes, self.max_uploads,
+                              self.upload_ttl, keep)
+        for path in removed:
+            self.upload_names.pop(os.path.basename(path)[:-len(_UPLOAD_SUFFIX)], None)
+
+    def store_upload(self, chunks, name=None):
+        """Spool an uploaded feed to disk, hashing it on the way. Compressed feeds
+        and zip archives are stored as they are. Returns the feed's id (its
+        content digest), size and, for a zip archive, the XML feeds inside."""
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            if not size:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "The request body is empty")
+            feed_id = digest.hexdigest()
+            path = self._upload_path(feed_id)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict_uploads(keep={path})
+
+        upload = {'feed': feed_id, 'bytes': size}
+        if name:
+            upload['name'] = self.upload_names[feed_id] = name
+        with open(path, 'rb') as file:
+            if detect_compression(file.read(6)) == 'zip':
+                upload['members'] = archive_members(path)
+        return upload
+
+    def resolve(self, reference, field):
+        """(source, name) for a feed reference in a request: an uploaded feed's
+        id, or an object with "feed" (an id) or "path" (below feed_root) and
+        optionally "member" (a feed in a zip archive) and "name"."""
+        if isinstance(reference, str):
+            reference = {'feed': reference}
+        if not isinstance(reference, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"{field} must be a feed id or an object with a feed id or path")
+        member = reference.get('member')
+
+        if 'feed' in reference:
+            feed_id = str(reference['feed'])
+            path = self._upload_path(feed_id)
+            self.evict_uploads()
+            try:
+                if not feed_id.isalnum():
+                    raise FileNotFoundError(path)
+                # Mark it as used, so it is evicted last
+                os.utime(path)
+            except FileNotFoundError:
+                raise RequestError(HTTPStatus.NOT_FOUND, f"Unknown feed {feed_id!r} in {field}, upload it to /feeds first")
+            source = (path, member, feed_id)
+            name = reference.get('name') or self.upload_names.get(feed_id) or feed_id
+        elif 'path' in reference:
+            path = os.path.realpath(os.path.join(self.feed_root, str(reference['path'])))
+            if os.path.commonpath([path, self.feed_root]) != self.feed_root:
+                raise RequestError(HTTPStatus.FORBIDDEN, f"{field} is outside the feed directory")
+            if not os.path.isfile(path):
+                raise RequestError(HTTPStatus.NOT_FOUND, f"No such feed file in {field}: {reference['path']}")
+            # Not hashed here: the worker digests the file when it loads it
+            source = (path, member, None)
+            name = reference.get('name') or os.path.basename(path)
+        else:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"{field} needs a feed id or a path")
+
+        if member:
+            name = f'{name}/{member}'
+        return source, name
+
+    def structure(self, request):
+        source1, name1 = self.resolve(_required(request, 'reference'), 'reference')
+        source2, name2 = self.resolve(_required(request, 'feed'), 'feed')
+        return self.run('structure', source1, source2, name1, name2, bool(request.get('reverse', False)))
+
+    def values(self, request):
+        source1, name1 = self.resolve(_required(request, 'reference'), 'reference')
+        source2, name2 = self.resolve(_required(request, 'feed'), 'feed')
+        if name1 == name2:
+            # The mismatch table has one value column per feed
+            name2 = f'{name2} (2)'
+        normalization = request.get('normalization') or None
+        try:
+            # Checked here so bad options are a 400, not an error from the worker
+            build_normalizer(normalization)
+        except (TypeError, ValueError) as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid normalization: {e}")
+        return self.run('values', source1, source2, name1, name2, request.get('key') or DEFAULT_KEY, normalization)
+
+    def required_fields(self, request):
+        """Every feed is checked in parallel; results are in request order"""
+        required_fields = _required(request, 'required_fields')
+        feeds = _required(request, 'feeds')
+        if not isinstance(feeds, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "feeds must be a list")
+        resolved = [self.resolve(reference, f'feeds[{position}]') for position, reference in enumerate(feeds)]
+        try:
+            # Compiled here so a bad rule list is a 400 instead of one error per feed
+            compile_rules(required_fields)
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e))
+
+        futures = [self.executor.submit(tasks.run_task, 'required_fields', source, name, required_fields)
+                   for source, name in resolved]
+        return {'results': [future.result() for future in futures]}
+
+    def profile(self, request):
+        source, name = self.resolve(_required(request, 'feed'), 'feed')
+        top = request.get('top')
+        if top is not None and (not isinstance(top, int) or top < 1):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "top must be a positive integer")
+        return {'file': name, **self.run('profile', source, request.get('field'), top)}
+
+def _required(request, name):
+    if name not in request:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Missing {name!r} in the request")
+    return request[name]
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of a FeedService (see Readme.md for the request shapes)"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'xml-checker'
+
+    json_routes = {
+        '/structure': FeedService.structure,
+        '/required-fields': FeedService.required_fields,
+        '/profile': FeedService.profile
+    }
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._handle(lambda: self._send_json({'status': 'ok', 'workers': self.service.workers, 'parser': self.service.parser}))
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"No such endpoint: GET {path}")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == '/feeds':
+            self._handle(lambda: self._send_json(self.service.store_upload(self._limited_body_chunks(), query.get('name')),
+                                                 HTTPStatus.CREATED))
+        elif url.path == '/values':
+            self._handle(lambda: self._send_values(self.service.values(self._json_body()), query.get('format', 'json')))
+        elif url.path in self.json_routes:
+            route = self.json_routes[url.path]
+            self._handle(lambda: self._send_json(route(self.service, self._json_body())))
+        else:
+            self._handle(lambda: _raise(RequestError(HTTPStatus.NOT_FOUND, f"No such endpoint: POST {url.path}")))
+
+    def _handle(self, respond):
+        self._body_state = None
+        self._streaming = False
+        try:
+            respond()
+        except Exception as e:
+            if self._streaming:
+                # Too late for an error response, cut the stream short instead
+                self.close_connection = True
+                return
+            self._drain_body()
+            if isinstance(e, RequestError):
+                self._send_error(e.status, str(e))
+            else:
+                self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+
+    # Request bodies
+
+    def _too_large(self):
+        return RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            f"The request body is larger than {self.service.max_upload_bytes // (1024 * 1024)} MB")
+
+    def handle_expect_100(self):
+        # Refuse an oversized body before the client sends it
+        length = self.headers.get('Content-Length', '')
+        if length.isdigit() and int(length) > self.service.max_upload_bytes:
+            self.close_connection = True
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, str(self._too_large()))
+            return False
+        return super().handle_expect_100()
+
+    def _limited_body_chunks(self):
+        """_body_chunks, refused with 413 past the service's max_upload_bytes: up
+        front when the Content-Length says so, otherwise as soon as a chunked
+        body grows past it. The rest of an oversized body is never read."""
+        limit = self.service.max_upload_bytes
+        self._body_state = 'reading'
+        if int(self.headers.get('Content-Length') or 0) > limit:
+            raise self._too_large()
+        size = 0
+        for chunk in self._body_chunks():
+            size += len(chunk)
+            if size > limit:
+                self._body_state = 'reading'
+                raise self._too_large()
+            yield chunk
+
+    def _body_chunks(self):
+        """Read the request body piece by piece, with a Content-Length or chunked"""
+        self._body_state = 'reading'
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Trailer section, up to the empty line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    self._body_state = 'read'
+                    return
+                while size:
+                    chunk = self.rfile.read(min(size, _READ_SIZE))
+                    if not chunk:
+                        raise RequestError(HTTPStatus.BAD_REQUEST, "Request body ended early")
+                    size -= len(chunk)
+                    yield chunk
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get('Content-Length') or 0)
+            while remaining:
+                chunk = self.rfile.read(min(remaining, _READ_SIZE))
+                if not chunk:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, "Request body ended early")
+                remaining -= len(chunk)
+                yield chunk
+            self._body_state = 'read'
+
+    def _drain_body(self):
+        # Whatever is left of the body must be consumed before the connection is reused
+        state = getattr(self, '_body_state', None)
+        if state == 'read':
+            return
+        if state == 'reading':
+            self.close_connection = True
+            return
+        try:
+            for _ in self._body_chunks():
+                pass
+        except Exception:
+            self.close_connection = True
+
+    def _json_body(self):
+        try:
+            request = json.loads(b''.join(self._limited_body_chunks()) or b'{}')
+        except ValueError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+        if not isinstance(request, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "The JSON body must be an object")
+        return request
+
+    # Responses
+
+    def _send_json(self, value, status=HTTPStatus.OK):
+        body = json.dumps(value, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            # e.g. the rest of the request body was left unread
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        try:
+            self._send_json({'error': message}, status)
+        except OSError:
+            # The client is gone
+            self.close_connection = True
+
+    def _send_chunks(self, content_type, chunks):
+        """Stream a response with chunked transfer encoding as chunks are produced"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._streaming = True
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(f'{len(chunk):x}\r\n'.encode('ascii') + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_values(self, result, export_format):
+        """Field value mismatches as streamed JSON (with the match summary) or as
+        CSV, Parquet or Arrow IPC (the table only)"""
+        mismatches = result['field_value_mismatches']
+        if export_format == 'json':
+            self._send_chunks('application/json', _iter_values_json(result['match'], mismatches))
+        elif export_format == 'csv':
+            self._send_chunks(EXPORT_FORMATS['csv'][1], iter_csv_chunks(mismatches))
+        elif export_format in EXPORT_FORMATS:
+            buffer = io.BytesIO()
+            write_frame(mismatches, buffer, export_format)
+            self._send_chunks(EXPORT_FORMATS[export_format][1], [buffer.getvalue()])
+        else:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown format {export_format!r}, expected json, {', '.join(EXPORT_FORMATS)}")
+
+def _raise(error):
+    raise error
+
+def _iter_values_json(match, mismatches):
+    yield (f'{{"match": {json.dumps(match, default=_json_default)}, '
+           f'"mismatch_count": {len(mismatches)}, "mismatches": [').encode('utf-8')
+    for start in range(0, len(mismatches), _JSON_CHUNK_ROWS):
+        rows = mismatches.iloc[start:start + _JSON_CHUNK_ROWS].to_json(orient='records', force_ascii=False)
+        yield ((',' if start else '') + rows[1:-1]).encode('utf-8')
+    yield b']}'
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+        self.verbose = verbose
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, feed_root='.', workers=1, parser='auto', cache_dir=None, verbose=False,
+          max_upload_mb=None, uploads_max_mb=None, max_uploads=None, upload_ttl_hours=None):
+    """Serve the JSON endpoints until interrupted"""
+    service = FeedService(feed_root, workers, parser, cache_dir, max_upload_mb, uploads_max_mb, max_uploads,
+                          upload_ttl_hours)
+    server = ServiceServer((host, port), service, verbose)
+    print(f'Serving on http://{host}:{server.server_port} with {workers} workers (feeds: {service.feed_root})')
+    # Stop the same way on SIGTERM (e.g. from a process supervisor) as on Ctrl+C
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
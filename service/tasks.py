@@ -0,0 +1,132 @@
+import os
+from collections import OrderedDict
+from data.xml_backend import set_backend
+from data.xml_stream import content_stream, mapped_file
+from data.parsed_feed import parse_feed_file
+from data.xml_processor import process_xml_content
+from data.required_fields import compile_rules
+from data.field_index import build_field_index
+from data.property_matcher import DEFAULT_KEY
+from data.normalization import build_normalizer
+from files.cache import DiskCache, content_digest, make_key
+
+# Parsed feeds and field indexes each worker keeps in memory, most recently used last
+MEMORY_ENTRIES = 8
+
+# Values listed per field when profiling every field of a feed
+PROFILE_TOP_VALUES = 10
+
+# Set once per pool worker by init_worker
+_cache_dir = None
+_memory = OrderedDict()
+
+def init_worker(parser, cache_dir):
+    global _cache_dir
+    set_backend(parser)
+    _cache_dir = cache_dir
+
+def ping():
+    return os.getpid()
+
+def run_task(name, *args):
+    """Run one of TASKS in a pool worker. Parse errors come back as ValueError:
+    parser exceptions don't always survive pickling to the serving process."""
+    try:
+        return TASKS[name](*args)
+    except SyntaxError as e:
+        raise ValueError(f"Error parsing XML: {e}") from None
+
+def _cached(key, compute):
+    if _cache_dir is None:
+        return compute()
+    return DiskCache(_cache_dir).get_or_compute(key, compute)
+
+def _remember(key, value):
+    _memory[key] = value
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+    return value
+
+def _load(kind, source, build):
+    """Per-worker memory, then the shared disk cache, then build(stream).
+
+    source is (path, zip member or None, digest or None); without a digest the
+    file is hashed. Keys match the web UI's and the CLI's, so a feed parsed by
+    either is not parsed again here."""
+    path, member, digest = source
+    if digest is not None and (kind, digest, member) in _memory:
+        _memory.move_to_end((kind, digest, member))
+        return _memory[(kind, digest, member)]
+
+    with mapped_file(path) as mapping:
+        if digest is None:
+            digest = content_digest(mapping)
+        if (kind, digest, member) in _memory:
+            _memory.move_to_end((kind, digest, member))
+            return _memory[(kind, digest, member)]
+        key = make_key(kind, digest) if member is None else make_key(kind, digest, member)
+        value = _cached(key, lambda: build(content_stream(mapping, member)))
+    return _remember((kind, digest, member), value)
+
+def load_feed(source):
+    return _load('feed', source, parse_feed_file)
+
+def load_field_index(source):
+    return _load('field_index', source, build_field_index)
+
+def compare_structure(source1, source2, name1, name2, reverse=False):
+    mode = "Missing Fields (Reverse)" if reverse else "Missing Fields"
+    return process_xml_content(load_feed(source1), load_feed(source2), name1, name2, mode)
+
+def compare_values(source1, source2, name1, name2, match_key=DEFAULT_KEY, normalization=None):
+    # The normalizer is shared by every request with the same options this worker serves
+    result = process_xml_content(load_feed(source1), load_feed(source2), name1, name2, "Field Values", match_key,
+                                 build_normalizer(normalization))
+    # The title sets are only needed by the UI's summary, the match carries the counts
+    del result['common_titles']
+    return result
+
+def check_required_fields(source, name, required_fields):
+    """Missing and invalid field counts of one feed, cached like the CLI's. A
+    broken feed is reported in its result."""
+    rules = compile_rules(required_fields)
+    path, member, digest = source
+    try:
+        with mapped_file(path) as mapping:
+            if digest is None:
+                digest = content_digest(mapping)
+            result = _cached(
+                make_key('required_fields', digest, member, rules.key()),
+                lambda: {'file': os.path.basename(path), **rules.check(content_stream(mapping, member))}
+            )
+    except Exception as e:
+        result = {'total_properties': 0, 'missing_fields_counts': {}, 'error': str(e)}
+    return {**result, 'file': name}
+
+def _field_profile(stats, top):
+    return {
+        'count': stats.count,
+        'empty_count': stats.empty_count,
+        'non_empty_count': stats.non_empty_count,
+        'distinct_values': len(stats.values),
+        'top_values': stats.values.most_common(top),
+        'samples': stats.samples
+    }
+
+def profile_fields(source, field=None, top=None):
+    """Occurrence counts and value histograms per field (the Field Explorer's
+    index). With field only that field is profiled, listing top values (every
+    value when top is None); otherwise every field with PROFILE_TOP_VALUES."""
+    index = load_field_index(source)
+    if field is None:
+        return {'fields': {tag: _field_profile(stats, top or PROFILE_TOP_VALUES) for tag, stats in sorted(index.items())}}
+    if field not in index:
+        raise KeyError(f"No field {field!r} in the feed")
+    return {'field': field, **_field_profile(index[field], top)}
+
+TASKS = {
+    'structure': compare_structure,
+    'values': compare_values,
+    'required_fields': check_required_fields,
+    'profile': profile_fields
+}
@@ -0,0 +1,15 @@
+import streamlit as st
+from data.xml_backend import available_backends, default_backend_name, get_backend
+
+def parser_selector():
+    """The XML Parser selector next to the navigation. The choice is kept in
+    this browser session's state, so sessions picking different parsers don't
+    switch each other's backend."""
+    choices = available_backends()
+    default = default_backend_name()
+    st.selectbox("XML Parser", choices, index=choices.index(default) if default in choices else 0, key='parser',
+                 help="'auto' uses lxml when it is installed and falls back to the standard library")
+
+def session_backend():
+    """Parser backend picked in this session, to pass to the parsing functions"""
+    return get_backend(st.session_state.get('parser', default_backend_name()))
@@ -1,25 +1,51 @@
 import streamlit as st
-import pandas as pd
+from data.required_fields import field_report
 
 def display_results(results, show_all_fields, columns_to_show):
-    for file_name, missing_in_file1, _, _ in results:  # We only care about `missing_in_file1`
-        st.header(f"Results for {file_name}")
+    """Per-file required field report: missing (and invalid) counts and percentages per field.
+    columns_to_show limits the fields listed; without show_all_fields only failing fields are."""
+    import pandas as pd
 
-        # Convert the set of missing fields into a DataFrame for display
-        df_missing_in_file1 = pd.DataFrame(missing_in_file1, columns=['Fields Missing in XML'])
-        df_missing_in_file1_sorted = df_missing_in_file1.sort_values(by='Title')
+    for result in results:
+        st.header(f"Results for {result['file']}")
+        if result.get('error'):
+            st.error(f"Error parsing XML file: {result['error']}")
+            continue
+
+        st.write(f"Total number of properties: {result['total_properties']}")
+        df = pd.DataFrame(field_report(result), columns=['Field', 'Missing', 'Missing %', 'Invalid', 'Invalid %'])
+        if not result.get('invalid_fields_counts'):
+            df = df.drop(columns=['Invalid', 'Invalid %'])
 
-        # Filter columns if necessary (though in this case, there is only one column)
         if columns_to_show:
-            df_missing_in_file1 = df_missing_in_file1_sorted[df_missing_in_file1_sorted.columns.intersection(columns_to_show)]
+            df = df[df['Field'].isin(columns_to_show)]
 
         # Show all fields or only missing ones depending on the user's choice
-        if show_all_fields:
-            st.write("Fields Missing in XML:")
-            st.write(df_missing_in_file1_sorted)
-        else:
-            if df_missing_in_file1_sorted.empty:
+        if not show_all_fields:
+            failing = df['Missing'] > 0
+            if 'Invalid' in df:
+                failing |= df['Invalid'] > 0
+            df = df[failing]
+            if df.empty:
                 st.write("No fields missing in this XML file.")
-            else:
-                st.write("Fields Missing in XML:")
-                st.write(df_missing_in_file1_sorted)
\ No newline at end of file
+                continue
+
+        st.write("Fields Missing in XML:")
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
+def display_diagnostics(records):
+    """Show the per-stage timings recorded by data.instrumentation"""
+    import pandas as pd
+
+    with st.expander("Diagnostics", expanded=True):
+        if not records:
+            st.write("No processing stages ran in this run.")
+            return
+
+        df = pd.DataFrame({
+            'Stage': ['\u2003' * record['depth'] + record['stage'] for record in records],
+            'Wall (s)': [record['wall_s'] for record in records],
+            'CPU (s)': [record['cpu_s'] for record in records],
+            'Peak memory (MB)': [record['peak_mb'] for record in records]
+        })
+        st.dataframe(df, use_container_width=True, hide_index=True)
\ No newline at end of file
@@ -0,0 +1,49 @@
+import io
+import streamlit as st
+from files.export import EXPORT_FORMATS, export_file_name, write_frame
+
+EXPORT_LABELS = {'csv': 'CSV', 'parquet': 'Parquet', 'arrow': 'Arrow IPC'}
+
+# Exports built in this process, shared by every session: one per table and
+# format, so reruns and other sessions showing the same table reuse it.
+# _write(file) writes the export to a binary file object.
+@st.cache_resource(show_spinner=False, max_entries=16, ttl=3600)
+def export_bytes(key, data_key, export_format, _write):
+    buffer = io.BytesIO()
+    _write(buffer)
+    return buffer.getvalue()
+
+def _request_export(key, data_key, export_format):
+    st.session_state[f'{key}_requested'] = (data_key, export_format)
+
+def download_export(label, write, file_name, mime, key, data_key, export_format=None):
+    """Prepare button, then download button, for a file written by write(file).
+
+    Nothing is written until the user asks for it, and the result is cached
+    per (key, data_key, export_format) (see export_bytes), so reruns don't
+    write it again. data_key identifies the content, e.g. the comparison it
+    comes from. Streamlit's download button holds the file in memory while
+    it is shown, so the export is built in memory too.
+    """
+    if st.session_state.get(f'{key}_requested') != (data_key, export_format):
+        st.button(f"Prepare {label}", key=f'{key}_prepare',
+                  on_click=_request_export, args=(key, data_key, export_format))
+        return
+    with st.spinner("Preparing download..."):
+        data = export_bytes(key, data_key, export_format, write)
+    st.download_button(label, data, file_name=file_name, mime=mime, key=key)
+
+def download_frame(df, label, base_name, key, data_key):
+    """Format picker and download button for a table (see download_export).
+    CSV is written chunk by chunk, and Parquet and Arrow keep Title/Field
+    dictionary-encoded."""
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        export_format = st.selectbox("Export format", list(EXPORT_FORMATS), format_func=EXPORT_LABELS.get,
+                                     key=f'{key}_format', label_visibility='collapsed')
+
+    with col2:
+        download_export(f"{label} ({EXPORT_LABELS[export_format]})",
+                        lambda file: write_frame(df, file, export_format),
+                        export_file_name(base_name, export_format), EXPORT_FORMATS[export_format][1],
+                        key, data_key, export_format)
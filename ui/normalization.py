@@ -0,0 +1,25 @@
+import streamlit as st
+from data.normalization import ENTITY_MODES, NUMERIC_MODES
+
+ENTITY_LABELS = {'basic': 'Common entities (&lt; &gt; € nbsp)', 'full': 'All HTML entities', 'none': 'None'}
+NUMERIC_LABELS = {'float': 'As numbers', 'tolerance': 'Within a tolerance', 'decimal': 'As exact decimals', 'text': 'As text'}
+
+def normalization_options(key):
+    """Sidebar settings for how values are normalized and compared.
+
+    Returns the options as a tuple (see data/normalization.get_normalizer),
+    which is hashable, so it can key the comparison caches.
+    """
+    with st.sidebar.expander("Value normalization"):
+        entities = st.selectbox("Decode HTML entities", ENTITY_MODES, format_func=ENTITY_LABELS.get,
+                                key=f'{key}_entities')
+        collapse_whitespace = st.checkbox("Collapse repeated whitespace", key=f'{key}_whitespace')
+        numeric = st.selectbox("Compare numeric values", NUMERIC_MODES, format_func=NUMERIC_LABELS.get,
+                               key=f'{key}_numeric',
+                               help="Decimal compares 1.10 and 1.1 as equal without float rounding; text compares every value as text")
+        tolerance = 0.0
+        if numeric == 'tolerance':
+            tolerance = st.number_input("Tolerance", min_value=0.0, value=0.01, step=0.01, format='%g',
+                                        key=f'{key}_tolerance',
+                                        help="Largest difference between two numbers that still counts as equal")
+    return entities, collapse_whitespace, numeric, float(tolerance)
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from files.html_report import iter_html_report
+
+TITLE_COLORS = np.array(['background-color: #f5f5f5', 'background-color: #ffffff'], dtype=object)
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+
+def title_groups(df):
+    """0/1 per row, alternating each time a new title is first seen.
+    Computed once for the whole frame with pd.factorize."""
+    codes, _ = pd.factorize(df['Title'])
+    return codes % 2
+
+def highlight_rows_by_title(df, groups=None):
+    """Style rows with alternating background colours per title.
+    groups (from title_groups) lets a page slice keep the colours of the full frame."""
+    if groups is None:
+        groups = title_groups(df)
+    row_colors = TITLE_COLORS[groups]
+    styles = pd.DataFrame(np.repeat(row_colors[:, None], len(df.columns), axis=1),
+                          index=df.index, columns=df.columns)
+    return df.style.apply(lambda _: styles, axis=None)
+
+def generate_html_table(df, file1_name, file2_name):
+    """HTML report of a few rows (e.g. the visible page) as one string; the full
+    report is written chunk by chunk with files/html_report.write_html_report"""
+    return "".join(iter_html_report(df, file1_name, file2_name))
+
+def _visible_positions(df, fields, title_filter, sort_column, ascending):
+    """Row positions left after filtering and sorting, without copying the frame"""
+    mask = np.ones(len(df), dtype=bool)
+    if fields:
+        mask &= df['Field'].isin(fields).to_numpy()
+    if title_filter:
+        mask &= df['Title'].astype(str).str.contains(title_filter, case=False, regex=False).to_numpy()
+    positions = np.flatnonzero(mask)
+
+    if sort_column:
+        column = df[sort_column].to_numpy()[positions].astype(str)
+        order = np.argsort(column, kind='stable')
+        if not ascending:
+            order = order[::-1]
+        positions = positions[order]
+    return positions
+
+def render_mismatch_table(df, key):
+    """Paginated view of a field value mismatch frame.
+
+    Filtering and sorting work on arrays of row positions and only the rows of
+    the visible page are copied, styled and sent to the browser. key must be
+    unique per result so widget state and title groups aren't mixed up.
+    """
+    # Only the shown result's groups are kept; another result replaces them
+    # instead of piling up in session state for the rest of the session
+    cached = st.session_state.get('mismatch_title_groups')
+    if cached is None or cached[0] != key:
+        cached = st.session_state.mismatch_title_groups = (key, title_groups(df))
+    groups = cached[1]
+
+    col1, col2, col3, col4 = st.columns([3, 3, 2, 1])
+    with col1:
+        fields = st.multiselect("Filter by Field", sorted(df['Field'].unique()), key=f'{key}_fields')
+    with col2:
+        title_filter = st.text_input("Filter by Title", key=f'{key}_title')
+    with col3:
+        sort_column = st.selectbox("Sort by", ["", *df.columns], key=f'{key}_sort',
+                                   format_func=lambda column: column or "Original order")
+    with col4:
+        ascending = st.radio("Order", ["Asc", "Desc"], key=f'{key}_order') == "Asc"
+
+    positions = _visible_positions(df, fields, title_filter, sort_column, ascending)
+    if not len(positions):
+        st.write("No rows match the current filters.")
+        return df.iloc[positions]
+
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f'{key}_page_size')
+    page_count = (len(positions) + page_size - 1) // page_size
+    # Filters can shrink the result below the page the user was on
+    if st.session_state.get(f'{key}_page', 1) > page_count:
+        st.session_state[f'{key}_page'] = page_count
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key=f'{key}_page')
+    with col3:
+        st.write("")
+        st.caption(f"Page {page} of {page_count}, {len(positions)} matching rows")
+
+    page_positions = positions[(page - 1) * page_size:page * page_size]
+    page_df = df.iloc[page_positions]
+    st.dataframe(highlight_rows_by_title(page_df, groups[page_positions]), use_container_width=True)
+    return page_df
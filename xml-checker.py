@@ -1,53 +1,601 @@
 import os
+import csv
 import json
-import xml.etree.ElementTree as ET
+import time
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from data.xml_backend import BACKEND_CHOICES, set_backend
+from data.xml_stream import FEED_READ_ERRORS, content_stream, expand_archives, is_feed_file, mapped_file
+from data.required_fields import compile_rules, field_report
+from data import instrumentation
+from data.instrumentation import stage
+from files.cache import DEFAULT_CACHE_DIR, DiskCache, content_digest, make_key
+from files.watcher import FeedWatcher, delta_report
+from files.export import format_for_path, write_frame
+from data.normalization import DEFAULT_NORMALIZER, ENTITY_MODES, NUMERIC_MODES, get_normalizer
 
 def load_required_fields(json_file_path):
+    """Load and compile the required fields rule set from a JSON file"""
     with open(json_file_path, 'r') as file:
         data = json.load(file)
-        return data.get("required_fields", [])
+        return compile_rules(data.get("required_fields", []))
+
+def count_missing_fields(file_path, required_fields, source=None):
+    """Count, per required field, how many properties in the file lack it (and,
+    for fields with type or non-empty constraints, how many fail them).
+    required_fields is a RuleSet or the raw required_fields list; source is an
+    already opened (e.g. memory-mapped) file object for file_path."""
+    # The rules are compiled once and each property is checked in a single pass
+    # over its children; properties are streamed so memory stays flat
+    result = compile_rules(required_fields).check(source if source is not None else file_path)
+    return {'file': os.path.basename(file_path), **result}
+
+def print_missing_fields(result):
+    print('-----------------------------------------')
+    print(f'File: {result["file"]}')
+    if result.get('error'):
+        print(f'Error: {result["error"]}')
+    else:
+        print(f'Total number of properties: {result["total_properties"]}')
+        print('Number of properties missing each field:')
+        for row in field_report(result):
+            line = f'  {row["Field"]}: {row["Missing"]} properties ({row["Missing %"]}%)'
+            if row['Field'] in result.get('invalid_fields_counts', {}):
+                line += f', {row["Invalid"]} invalid ({row["Invalid %"]}%)'
+            print(line)
+    print('-----------------------------------------')
 
 def check_missing_fields(file_path, required_fields):
-    # Load the XML file
-    tree = ET.parse(file_path)
-    root = tree.getroot()
+    result = count_missing_fields(file_path, required_fields)
+    print_missing_fields(result)
+    return result
+
+def _check_file(feed, required_fields, cache_dir=None):
+    # A broken feed is reported in its own result instead of aborting the whole batch
+    profiling = instrumentation.is_enabled()
+    if profiling:
+        instrumentation.reset()
+
+    name = feed[0]
+    try:
+        with stage(f'check {name}'):
+            result = _check_file_cached(feed, required_fields, cache_dir)
+    except Exception as e:
+        result = {
+            'file': name,
+            'total_properties': 0,
+            'missing_fields_counts': {},
+            'error': str(e)
+        }
+
+    if profiling:
+        result['stages'] = instrumentation.records()
+    return result
+
+def _check_file_cached(feed, required_fields, cache_dir):
+    name, file_path, member = feed
+    # The feed is memory-mapped: hashing and parsing read it straight from the
+    # page cache, and compressed feeds are decompressed as they are parsed
+    with mapped_file(file_path) as mapping:
+        if cache_dir is None:
+            with stage('parse and count'):
+                result = count_missing_fields(file_path, required_fields, content_stream(mapping, member))
+            return {**result, 'file': name}
+
+        # A feed whose bytes were checked before (under any name) is not parsed again
+        with stage('digest'):
+            key = make_key('required_fields', content_digest(mapping), member, required_fields.key())
+        with stage('parse and count (on cache miss)'):
+            result = DiskCache(cache_dir).get_or_compute(
+                key, lambda: count_missing_fields(file_path, required_fields, content_stream(mapping, member))
+            )
+    return {**result, 'file': name}
+
+def list_feeds(file_paths):
+    """(name, path, member) for every feed in file_paths; a zip archive
+    contributes one entry per XML file it holds, named archive.zip/member.xml.
+
+    Returns (feeds, failed): failed holds (name, error message) for every
+    file that couldn't be read, e.g. a truncated archive, so one broken file
+    doesn't stop the rest of the batch."""
+    feeds = []
+    failed = []
+    for path in file_paths:
+        name = os.path.basename(path)
+        try:
+            feeds.extend(expand_archives([(name, path)]))
+        except FEED_READ_ERRORS as e:
+            failed.append((name, str(e)))
+    return feeds, failed
+
+def _read_error(name, error):
+    """Check result of a feed that couldn't be read"""
+    return {'file': name, 'total_properties': 0, 'missing_fields_counts': {}, 'error': error}
+
+def _init_worker(parser, profile):
+    set_backend(parser)
+    if profile:
+        instrumentation.enable()
+
+def check_files(feeds, required_fields, workers=1, parser='auto', cache_dir=None):
+    """Check feeds (from list_feeds) in a process pool, yielding results in order.
+    Results are cached on disk under cache_dir unless it is None. When profiling
+    is enabled every result carries the stages recorded while checking it."""
+    if workers == 1:
+        for feed in feeds:
+            yield _check_file(feed, required_fields, cache_dir)
+        return
+
+    initargs = (parser, instrumentation.is_enabled())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        yield from executor.map(_check_file, feeds, repeat(required_fields), repeat(cache_dir))
+
+def write_summary(results, summary_path, required_fields):
+    """Write per-file missing (and invalid) field counts as JSON, CSV, Parquet or
+    Arrow IPC, chosen by file extension"""
+    export_format = format_for_path(summary_path, default=None)
+    if export_format is None:
+        with open(summary_path, 'w') as file:
+            json.dump(results, file, indent=2)
+        return
+
+    invalid_fields = [rule.path for rule in required_fields.rules if rule.constrained]
+    header = ['file', 'total_properties', *required_fields.fields,
+              *[f'{field} (invalid)' for field in invalid_fields], 'error']
+    rows = ([result['file'], result['total_properties'],
+             *[result['missing_fields_counts'].get(field, '') for field in required_fields.fields],
+             *[result.get('invalid_fields_counts', {}).get(field, '') for field in invalid_fields],
+             result.get('error', '')] for result in results)
+    if export_format == 'csv':
+        with open(summary_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+    else:
+        import pandas as pd
+
+        # Columnar formats need typed columns: a failed file has no counts (null)
+        rows = [[None if value == '' and position not in (0, len(header) - 1) else value
+                 for position, value in enumerate(row)] for row in rows]
+        write_frame(pd.DataFrame(rows, columns=header), summary_path, export_format)
 
-    # Initialize variables to store counts and track missing fields
-    total_properties = 0
-    missing_fields_counts = {field: 0 for field in required_fields}
+def print_key_problems(duplicates, unkeyed, key_field):
+    if duplicates:
+        print(f'  Duplicate keys (not compared): {len(duplicates)} ({sum(duplicates.values())} properties)')
+    if unkeyed:
+        print(f'  Properties without {key_field}: {unkeyed}')
 
-    # Loop through each property to check for missing fields
-    for property in root.findall('.//property'):
-        total_properties += 1
-        for field in required_fields:
-            # Use the find() method to look for direct children of the property element
-            element = property.find(f'./{field}')
-            # Check if the field is completely missing (not present)
-            if element is None:
-                missing_fields_counts[field] += 1
+def diff_feed(feed_path, snapshot_dir, key_field, output_path=None, update=True, normalizer=DEFAULT_NORMALIZER):
+    """Diff a feed against the snapshot stored on the previous run, then store the new one"""
+    # Imported here, like the other commands' dependencies, so a plain check
+    # run doesn't load pandas and NumPy
+    from data.parsed_feed import parse_feed_file
+    from data.snapshot import build_snapshot, diff_against_snapshot, load_snapshot, save_snapshot, snapshot_path
+
+    file_name = os.path.basename(feed_path)
+    path = snapshot_path(snapshot_dir, file_name)
+    with stage('parse'):
+        feed = parse_feed_file(feed_path)
+    with stage('load snapshot'):
+        snapshot = load_snapshot(path)
 
-    # Print the results
     print('-----------------------------------------')
-    print(f'File: {os.path.basename(file_path)}')
-    print(f'Total number of properties: {total_properties}')
-    print('Number of properties missing each field:')
-    for field, count in missing_fields_counts.items():
-        print(f'  {field}: {count} properties')
+    print(f'File: {file_name}')
+    if snapshot is None or snapshot['key_field'] != key_field:
+        snapshot = build_snapshot(feed, file_name, key_field)
+        save_snapshot(snapshot, path)
+        print(f'No snapshot keyed by {key_field} yet, recorded {len(snapshot["entries"])} properties as the baseline')
+        print_key_problems(snapshot['duplicates'], snapshot['unkeyed'], key_field)
+        print('-----------------------------------------')
+        return None
+
+    with stage('diff'):
+        result = diff_against_snapshot(snapshot, feed, file_name, normalizer)
+    mismatches = result['field_value_mismatches']
+    print(f'Compared with snapshot from {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["created"]))} (key: {key_field})')
+    print(f'  Added properties: {len(result["added"])}')
+    print(f'  Removed properties: {len(result["removed"])}')
+    print(f'  Changed properties: {len(result["changed"])}')
+    print(f'  Unchanged properties: {result["unchanged_count"]}')
+    print(f'  Field value mismatches: {len(mismatches)}')
+    print_key_problems(result['duplicates_in_current'], result['unkeyed_current'], key_field)
     print('-----------------------------------------')
 
+    if output_path:
+        with stage('write output'):
+            write_frame(mismatches, output_path)
+    if update:
+        with stage('save snapshot'):
+            save_snapshot(result['snapshot'], path)
+    return result
+
+def compare_feeds_to_reference(reference_path, feed_paths, workers=1, parser='auto', summary_path=None, match_key='Title',
+                               normalizer=DEFAULT_NORMALIZER):
+    """Compare many feeds against one reference feed, which is parsed only once"""
+    from data.parsed_feed import parse_feed_file
+    from data.multi_comparator import compare_many, presence_matrix
+
+    reference_name = os.path.basename(reference_path)
+    with stage('parse reference'):
+        with mapped_file(reference_path) as mapping:
+            reference = parse_feed_file(content_stream(mapping))
+
+    results = []
+    feeds, failed = list_feeds(feed_paths)
+    names = [name for name, _, _ in feeds]
+    candidates = [(path, member) for _, path, member in feeds]
+    with stage('compare feeds'):
+        unreadable = [{'file': name, 'total_properties': 0, 'error': error} for name, error in failed]
+        for result in chain(unreadable, compare_many(reference, candidates, names, reference_name, workers, parser,
+                                                     match_key, normalizer)):
+            print('-----------------------------------------')
+            print(f"File: {result['file']}")
+            if 'error' in result:
+                print(f"Error: {result['error']}")
+            else:
+                print(f"Total number of properties: {result['total_properties']} ({result['matched_properties']} matched with {reference_name} on {match_key})")
+                if result['duplicate_keys']:
+                    print(f"Duplicate keys (not compared): {result['duplicate_keys']}")
+                print(f"Missing fields: {', '.join(result['missing_fields']) or 'none'}")
+                print(f"Extra fields: {', '.join(result['extra_fields']) or 'none'}")
+                print(f"Field value mismatches: {result['value_mismatches']} in {result['mismatched_properties']} properties")
+            results.append(result)
+    print('-----------------------------------------')
+
+    matrix = presence_matrix(reference, results)
+    print(f'Field presence (reference: {reference_name}):')
+    print(matrix.to_string())
+
+    if summary_path:
+        with stage('write summary'):
+            if format_for_path(summary_path, default=None):
+                write_frame(matrix.reset_index(), summary_path)
+            else:
+                with open(summary_path, 'w') as file:
+                    json.dump({
+                        'reference': reference_name,
+                        'feeds': results,
+                        'presence_matrix': matrix.to_dict(orient='index')
+                    }, file, indent=2)
+    return results
+
+def compare_out_of_core(reference_path, feed_path, key_field='Title', store_path=None, output_path=None,
+                        batch_size=None, cache_mb=None, normalizer=DEFAULT_NORMALIZER):
+    """Compare two feeds through an on-disk SQLite store (data/feed_store.py)
+    instead of in memory, for feeds larger than RAM. Mismatches are counted
+    and written to output_path batch by batch."""
+    from collections import Counter
+    from data.feed_store import DEFAULT_CACHE_MB, FeedStore
+    from data.value_comparator import MATCH_BATCH_SIZE
+    from files.export import write_frames
+
+    reference_name = os.path.basename(reference_path)
+    feed_name = os.path.basename(feed_path)
+    if feed_name == reference_name:
+        # The mismatch table has one value column per feed
+        feed_name = f'{feed_name} (2)'
+
+    with FeedStore(store_path, cache_mb or DEFAULT_CACHE_MB) as store:
+        with stage('load reference'):
+            reference = store.load(reference_path, reference_name, key_field)
+        with stage('load compared'):
+            feed = store.load(feed_path, feed_name, key_field)
+        with stage('compare structure'):
+            structure = store.compare_structure(reference, feed)
+            extra_fields = store.compare_structure(feed, reference)['missing_in_second_file']
+        with stage('match properties'):
+            match = store.match(reference, feed)
+
+        mismatches_by_field = Counter()
+        mismatched_properties = 0
+
+        def counted(frames):
+            nonlocal mismatched_properties
+            for frame in frames:
+                mismatches_by_field.update(frame['Field'])
+                # Batches hold disjoint pairs, so their distinct keys add up
+                mismatched_properties += frame['Key' if 'Key' in frame else 'Title'].nunique()
+                yield frame
+
+        with stage('compare values'):
+            frames = counted(store.iter_value_mismatches(reference, feed, reference_name, feed_name,
+                                                         batch_size or MATCH_BATCH_SIZE, normalizer))
+            if output_path:
+                write_frames(frames, output_path, format_for_path(output_path))
+            else:
+                for _ in frames:
+                    pass
+        reference_count = store.feed_info(reference)['property_count']
+        feed_count = store.feed_info(feed)['property_count']
+
+    print('-----------------------------------------')
+    print(f'Reference: {reference_name} ({reference_count} properties)')
+    print(f'File: {feed_name} ({feed_count} properties)')
+    print(f"Matched on {key_field}: {match['matched']}")
+    print(f"  Only in {reference_name}: {match['only_in_first']}")
+    print(f"  Only in {feed_name}: {match['only_in_second']}")
+    if match['duplicates_in_first'] or match['duplicates_in_second']:
+        print(f"  Duplicate keys (not compared): {match['duplicates_in_first']} / {match['duplicates_in_second']}")
+    if match['unkeyed_first'] or match['unkeyed_second']:
+        print(f"  Without a key: {match['unkeyed_first']} / {match['unkeyed_second']}")
+    print(f"Missing fields: {', '.join(structure['missing_in_second_file']) or 'none'}")
+    print(f"Extra fields: {', '.join(extra_fields) or 'none'}")
+    print(f"Field value mismatches: {sum(mismatches_by_field.values())} in {mismatched_properties} properties")
+    for field, count in mismatches_by_field.most_common():
+        print(f'  {field}: {count}')
+    print('-----------------------------------------')
+    return {
+        'structure': structure,
+        'extra_fields': extra_fields,
+        'match': match,
+        'mismatches_by_field': dict(mismatches_by_field),
+        'mismatched_properties': mismatched_properties
+    }
+
+def _rules_stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def _check_changed_files(file_names, xml_dir, required_fields, workers, parser, cache_dir):
+    """Check the given files of xml_dir, returning {file name: [results]}.
+    A zip archive gives one result per feed inside it."""
+    feeds = []
+    results = {}
+    for file_name in file_names:
+        entries, failed = list_feeds([os.path.join(xml_dir, file_name)])
+        results[file_name] = [_read_error(name, error) for name, error in failed]
+        feeds.extend((file_name, entry) for entry in entries)
+
+    workers = max(1, min(workers, len(feeds)))
+    checked = check_files([entry for _, entry in feeds], required_fields, workers, parser, cache_dir)
+    for (file_name, _), result in zip(feeds, checked):
+        results[file_name].append(result)
+    return results
+
+def _format_count(count):
+    return '-' if count is None else count
+
+def print_result_delta(delta):
+    print('-----------------------------------------')
+    print(f'Modified: {delta["file"]}')
+    before, after = delta['error']
+    if after:
+        print(f'Error: {after}')
+    elif before:
+        print(f'Error fixed: {before}')
+    before, after = delta['total_properties']
+    if before != after:
+        print(f'Total number of properties: {before} -> {after} ({after - before:+d})')
+    for field, (before, after) in delta['missing_fields_counts'].items():
+        print(f'  {field}: {_format_count(before)} -> {_format_count(after)} properties missing')
+    for field, (before, after) in delta['invalid_fields_counts'].items():
+        print(f'  {field}: {_format_count(before)} -> {_format_count(after)} properties invalid')
+    print('-----------------------------------------')
+
+def watch_feeds(xml_dir, required_fields_path, interval=5.0, workers=1, parser='auto', cache_dir=None,
+                state_path=None, summary_path=None, report_path=None, once=False):
+    """Re-check the feeds of xml_dir whenever they change and print what changed.
+
+    Between scans the directory is only stat()ed; feeds are hashed when their
+    mtime or size changed and parsed only when their content did (see
+    FeedWatcher), so an idle watch costs next to no CPU. Every scan that finds
+    changes prints the new feeds in full and, for modified ones, only the
+    counts that changed; removed feeds are listed. report_path gets one JSON
+    line per such scan, summary_path is rewritten with the latest results of
+    every feed. With state_path the file states and results survive restarts,
+    and once=True makes a single incremental pass, e.g. from cron.
+    """
+    rules_stat = _rules_stat(required_fields_path)
+    required_fields = load_required_fields(required_fields_path)
+    watcher = FeedWatcher(xml_dir, is_feed_file, required_fields.key(), state_path)
+
+    try:
+        while True:
+            if _rules_stat(required_fields_path) != rules_stat:
+                rules_stat = _rules_stat(required_fields_path)
+                required_fields = load_required_fields(required_fields_path)
+                watcher.reset(required_fields.key())
+                print(f'{required_fields_path} changed, checking every feed again')
+
+            new, modified, removed = watcher.scan()
+            if new or modified or removed:
+                scanned_at = time.strftime("%Y-%m-%d %H:%M:%S")
+                print(f'[{scanned_at}] {len(new)} new, {len(modified)} modified, {len(removed)} removed')
+                checked = _check_changed_files(new + modified, xml_dir, required_fields, workers, parser, cache_dir)
+
+                report = {'time': scanned_at, 'added': [], 'changed': [], 'removed': []}
+                for file_name in new + modified:
+                    added, changed, gone = delta_report(watcher.update(file_name, checked[file_name]), checked[file_name])
+                    for result in added:
+                        print_missing_fields(result)
+                    for delta in changed:
+                        print_result_delta(delta)
+                    report['added'].extend(added)
+                    report['changed'].extend(changed)
+                    report['removed'].extend(gone)
+                for file_name in removed:
+                    report['removed'].extend(result['file'] for result in watcher.forget(file_name))
+                for name in report['removed']:
+                    print(f'Removed: {name}')
+
+                if summary_path:
+                    write_summary(watcher.all_results(), summary_path, required_fields)
+                if report_path:
+                    with open(report_path, 'a') as file:
+                        file.write(json.dumps(report) + '\n')
+
+            # Also after a scan that only re-hashed touched or racy files, so
+            # their new mtimes spare the next run (e.g. from cron) hashing them
+            watcher.save()
+            if once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        watcher.save()
+
+def write_profile(profile_path, profile):
+    if not profile_path:
+        return
+    if profile_path == '-':
+        json.dump(profile, sys.stderr, indent=2)
+        sys.stderr.write('\n')
+    else:
+        with open(profile_path, 'w') as file:
+            json.dump(profile, file, indent=2)
+
+def add_normalization_arguments(parser):
+    parser.add_argument('--entities', choices=ENTITY_MODES, default='basic',
+                        help="HTML entities decoded before comparing: a few common ones, all of them, or none (default: basic)")
+    parser.add_argument('--collapse-whitespace', action='store_true', help="Compare runs of whitespace inside values as one space")
+    parser.add_argument('--numeric', choices=NUMERIC_MODES,
+                        help="How values that are numbers on both sides are compared (default: tolerance with --tolerance, else float)")
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help="Largest difference between two numbers that still counts as equal (default: 0)")
+
+def normalizer_from_args(args):
+    numeric = args.numeric or ('tolerance' if args.tolerance else 'float')
+    return get_normalizer(args.entities, args.collapse_whitespace, numeric, args.tolerance)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the XML files in a directory for missing required fields.")
+    parser.add_argument('--parser', choices=BACKEND_CHOICES, default='auto',
+                        help="XML parser backend; 'auto' uses lxml when installed (default: auto)")
+    parser.add_argument('--xml-dir', default='xmls', help="Directory containing the XML files (default: xmls)")
+    parser.add_argument('--required-fields', default='required_fields.json',
+                        help="JSON file listing the required fields (default: required_fields.json)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of feeds to check in parallel; 0 uses every CPU core (default: 1)")
+    parser.add_argument('--summary', help="Write per-file missing field counts to this .json, .csv, .parquet or .arrow file")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="Directory of the persistent result cache (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true', help="Always re-parse every feed")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="Write per-stage wall time, CPU time and peak memory as JSON to FILE ('-' for stderr)")
+
+    subparsers = parser.add_subparsers(dest='command', title='commands',
+                                       description="Without a command, the feeds in --xml-dir are checked for missing required fields.")
+
+    diff_parser = subparsers.add_parser('diff', help="Diff a feed against the snapshot stored on its previous run")
+    diff_parser.add_argument('feed', help="XML feed to diff")
+    diff_parser.add_argument('--snapshot-dir', default='snapshots', help="Directory holding the per-feed snapshots (default: snapshots)")
+    diff_parser.add_argument('--key', default='Title',
+                             help="Field identifying a property across runs, e.g. Property_Reference (default: Title)")
+    diff_parser.add_argument('--output', help="Write the field value mismatches to this .csv, .parquet or .arrow file")
+    diff_parser.add_argument('--no-update', action='store_true', help="Keep the stored snapshot instead of replacing it with this feed")
+    add_normalization_arguments(diff_parser)
+
+    compare_parser = subparsers.add_parser('compare', help="Compare many feeds against one reference feed")
+    compare_parser.add_argument('reference', help="Reference XML feed (correct structure and values)")
+    compare_parser.add_argument('feeds', nargs='*', help="Feeds to compare (default: every other feed in --xml-dir)")
+    # SUPPRESS keeps the top-level --workers/--summary when these aren't given after the command
+    compare_parser.add_argument('--workers', type=int, default=argparse.SUPPRESS,
+                                help="Number of feeds to compare in parallel; 0 uses every CPU core (default: 1)")
+    compare_parser.add_argument('--summary', default=argparse.SUPPRESS, help="Write the field presence matrix to this .csv, .parquet or .arrow file, or every result to this .json file")
+    compare_parser.add_argument('--key', default='Title',
+                                help="Field(s) matching properties across feeds, e.g. Property_Reference or Project+Unit_Number (default: Title)")
+    add_normalization_arguments(compare_parser)
+
+    large_parser = subparsers.add_parser('compare-large',
+                                         help="Compare two feeds too large for memory through an on-disk SQLite store")
+    large_parser.add_argument('reference', help="Reference XML feed (correct structure and values)")
+    large_parser.add_argument('feed', help="Feed to compare")
+    large_parser.add_argument('--key', default='Title',
+                              help="Field(s) matching properties across feeds, e.g. Property_Reference or Project+Unit_Number (default: Title)")
+    large_parser.add_argument('--store', help="Keep the SQLite store in this file, so later runs on the same feeds don't load them again (default: a temporary file)")
+    large_parser.add_argument('--output', help="Write the field value mismatches to this .csv, .parquet or .arrow file, batch by batch")
+    large_parser.add_argument('--batch-size', type=int, help="Matched property pairs compared per batch (default: 50000)")
+    large_parser.add_argument('--cache-mb', type=int, help="SQLite page cache in MB; the rest of the store stays on disk (default: 64)")
+    add_normalization_arguments(large_parser)
+
+    watch_parser = subparsers.add_parser('watch', help="Keep checking --xml-dir, re-checking only feeds that changed")
+    watch_parser.add_argument('--interval', type=float, default=5.0, help="Seconds between directory scans (default: 5)")
+    watch_parser.add_argument('--workers', type=int, default=argparse.SUPPRESS,
+                              help="Number of changed feeds to check in parallel; 0 uses every CPU core (default: 1)")
+    watch_parser.add_argument('--state', help="Keep file states and results in this file, so restarts only check what changed since")
+    watch_parser.add_argument('--summary', default=argparse.SUPPRESS, help="Rewrite this .json, .csv, .parquet or .arrow file with the latest results of every feed after each change")
+    watch_parser.add_argument('--report', help="Append one JSON line per scan with the changes it found to this file")
+    watch_parser.add_argument('--once', action='store_true', help="Scan once and exit (for cron, together with --state)")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve structure, value, required-fields and profiling checks as JSON endpoints")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765)")
+    serve_parser.add_argument('--workers', type=int, default=0,
+                              help="Worker processes kept warm for requests; 0 uses every CPU core (default: 0)")
+    serve_parser.add_argument('--max-upload-mb', type=int,
+                              help="Largest accepted request body, e.g. an uploaded feed (default: 1024, or XML_CHECKER_MAX_UPLOAD_MB)")
+    serve_parser.add_argument('--uploads-max-mb', type=int,
+                              help="Disk space kept for uploaded feeds; the least recently used go first (default: 4096, or XML_CHECKER_UPLOADS_MAX_MB)")
+    serve_parser.add_argument('--max-uploads', type=int, help="Uploaded feeds kept at most (default: 256)")
+    serve_parser.add_argument('--upload-ttl', type=float,
+                              help="Hours an uploaded feed is kept after it was last used (default: 24, or XML_CHECKER_UPLOAD_TTL_HOURS)")
+    serve_parser.add_argument('--verbose', action='store_true', help="Log every request")
+    return parser.parse_args()
+
 def main():
-    # Directory containing XML files
-    xml_dir = 'xmls'
-    json_file_path = 'required_fields.json'
-    
+    args = parse_args()
+    set_backend(args.parser)
+    if args.profile:
+        instrumentation.enable()
+
+    if args.command == 'diff':
+        diff_feed(args.feed, args.snapshot_dir, args.key, args.output, not args.no_update, normalizer_from_args(args))
+        write_profile(args.profile, {'stages': instrumentation.records()})
+        return
+
+    if args.command == 'compare':
+        feed_paths = args.feeds or [os.path.join(args.xml_dir, file_name)
+                                    for file_name in sorted(os.listdir(args.xml_dir))
+                                    if is_feed_file(file_name)
+                                    and not os.path.samefile(os.path.join(args.xml_dir, file_name), args.reference)]
+        compare_feeds_to_reference(args.reference, feed_paths, args.workers or os.cpu_count(), args.parser, args.summary, args.key,
+                                   normalizer_from_args(args))
+        write_profile(args.profile, {'stages': instrumentation.records()})
+        return
+
+    if args.command == 'compare-large':
+        compare_out_of_core(args.reference, args.feed, args.key, args.store, args.output, args.batch_size, args.cache_mb,
+                            normalizer_from_args(args))
+        write_profile(args.profile, {'stages': instrumentation.records()})
+        return
+
+    if args.command == 'serve':
+        from service.server import serve
+        serve(args.host, args.port, args.xml_dir, args.workers or os.cpu_count(), args.parser,
+              None if args.no_cache else args.cache_dir, args.verbose, args.max_upload_mb, args.uploads_max_mb,
+              args.max_uploads, args.upload_ttl)
+        return
+
+    if args.command == 'watch':
+        cache_dir = None if args.no_cache else args.cache_dir
+        watch_feeds(args.xml_dir, args.required_fields, args.interval, args.workers or os.cpu_count(), args.parser,
+                    cache_dir, args.state, args.summary, args.report, args.once)
+        return
+
     # Load required fields from JSON file
-    required_fields = load_required_fields(json_file_path)
-    
-    # Iterate over each file in the xmls directory
-    for file_name in os.listdir(xml_dir):
-        if file_name.endswith('.xml'):
-            file_path = os.path.join(xml_dir, file_name)
-            check_missing_fields(file_path, required_fields)
+    required_fields = load_required_fields(args.required_fields)
+
+    # Sorted so the output order is stable regardless of worker scheduling;
+    # compressed feeds and zip archives of feeds are read as they are
+    feeds, failed = list_feeds([os.path.join(args.xml_dir, file_name)
+                                for file_name in sorted(os.listdir(args.xml_dir))
+                                if is_feed_file(file_name)])
+
+    workers = args.workers or os.cpu_count()
+    cache_dir = None if args.no_cache else args.cache_dir
+    results = []
+    file_stages = []
+    unreadable = [_read_error(name, error) for name, error in failed]
+    for result in chain(unreadable, check_files(feeds, required_fields, workers, args.parser, cache_dir)):
+        print_missing_fields(result)
+        if 'stages' in result:
+            file_stages.append({'file': result['file'], 'stages': result.pop('stages')})
+        results.append(result)
+
+    if args.summary:
+        write_summary(results, args.summary, required_fields)
+    write_profile(args.profile, {'files': file_stages})
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()